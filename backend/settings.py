@@ -1,3 +1,4 @@
+import multiprocessing
 from pathlib import Path
 from environs import Env
 
@@ -30,6 +31,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'scanlate.middleware.QueryProfilerMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -69,15 +71,60 @@ DATABASES = {
         'PASSWORD': env('POSTGRES_PASSWORD'),
         'HOST': env('POSTGRES_HOST'),
         'PORT': env.int('POSTGRES_PORT'),
+        # Keep connections between requests, health checks drop the ones the server has closed
+        'CONN_MAX_AGE': env.int('POSTGRES_CONN_MAX_AGE', 60),
+        'CONN_HEALTH_CHECKS': env.bool('POSTGRES_CONN_HEALTH_CHECKS', True),
     }
 }
 
+# Connections all server processes together may hold, keep it below PostgreSQL's max_connections
+# with room for management commands. The scanlate.W001 check warns when the sizing exceeds it.
+POSTGRES_CONNECTION_BUDGET = env.int('POSTGRES_CONNECTION_BUDGET', 80)
+
+# Application server processes, gunicorn.conf.py reads these as well.
+# Every thread keeps its own persistent connection, so the default worker count fits into the budget.
+SERVER_THREADS = env.int('GUNICORN_THREADS', 4)
+SERVER_WORKERS = env.int('GUNICORN_WORKERS', max(1, min(multiprocessing.cpu_count() * 2 + 1,
+                                                        POSTGRES_CONNECTION_BUDGET // SERVER_THREADS)))
+
+# psycopg pool per server process instead of persistent connections, requires psycopg[pool].
+# Each process needs at most one connection per thread.
+POSTGRES_POOL = env.bool('POSTGRES_POOL', False)
+if POSTGRES_POOL:
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': env.int('POSTGRES_POOL_MIN_SIZE', 1),
+            'max_size': env.int('POSTGRES_POOL_MAX_SIZE',
+                                max(1, min(SERVER_THREADS, POSTGRES_CONNECTION_BUDGET // SERVER_WORKERS))),
+            'timeout': env.int('POSTGRES_POOL_TIMEOUT', 10),
+        },
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
 AUTH_USER_MODEL = 'scanlate.User'
 
+# The preferred hasher makes new hashes, the others only verify old hashes which are upgraded on login.
+# argon2 requires argon2-cffi to be installed.
+PASSWORD_HASHER = env('PASSWORD_HASHER', 'scrypt')
+_PASSWORD_HASHERS = {
+    'scrypt': 'scanlate.hashers.ScanlateScryptPasswordHasher',
+    'argon2': 'scanlate.hashers.ScanlateArgon2PasswordHasher',
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+}
+PASSWORD_HASHERS = [_PASSWORD_HASHERS[PASSWORD_HASHER]] + [
+    hasher for name, hasher in _PASSWORD_HASHERS.items() if name != PASSWORD_HASHER
+]
+PASSWORD_SCRYPT_WORK_FACTOR = env.int('PASSWORD_SCRYPT_WORK_FACTOR', 2 ** 14)
+PASSWORD_SCRYPT_BLOCK_SIZE = env.int('PASSWORD_SCRYPT_BLOCK_SIZE', 8)
+PASSWORD_SCRYPT_PARALLELISM = env.int('PASSWORD_SCRYPT_PARALLELISM', 1)
+PASSWORD_ARGON2_TIME_COST = env.int('PASSWORD_ARGON2_TIME_COST', 2)
+PASSWORD_ARGON2_MEMORY_COST = env.int('PASSWORD_ARGON2_MEMORY_COST', 19 * 1024)
+PASSWORD_ARGON2_PARALLELISM = env.int('PASSWORD_ARGON2_PARALLELISM', 1)
+
 AUTH_PASSWORD_VALIDATORS = [
     # {
     #     'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -113,6 +160,45 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Parser
 REMANGA_TEAM_ID = env.int('REMANGA_TEAM_ID')
 REMANGA_TOKEN = env('REMANGA_TOKEN')
+REMANGA_API_URL = env('REMANGA_API_URL', 'https://api.remanga.org/api/')
+REMANGA_TIMEOUT = env.float('REMANGA_TIMEOUT', 10)
+REMANGA_RETRIES = env.int('REMANGA_RETRIES', 3)
+REMANGA_BACKOFF = env.float('REMANGA_BACKOFF', 0.5)
+REMANGA_MAX_RETRY_DELAY = env.float('REMANGA_MAX_RETRY_DELAY', 10)  # caps Retry-After
+REMANGA_INTERACTIVE_DEADLINE = env.float('REMANGA_INTERACTIVE_DEADLINE', 15)  # seconds, below the gunicorn timeout
+REMANGA_MAX_CONNECTIONS = env.int('REMANGA_MAX_CONNECTIONS', 8)
+REMANGA_RATE_LIMIT = env.float('REMANGA_RATE_LIMIT', 10)  # requests per second per host
+REMANGA_CACHE = 'remanga'
+REMANGA_CACHE_TTL = env.int('REMANGA_CACHE_TTL', 10 * 60)  # seconds before revalidation
+
+
+# Cache
+# locmem is per process and can't invalidate other workers, so the response, count, roles and token caches
+# are skipped with it. Use file (one host) or redis (requires the redis package) with several workers.
+_CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', ''),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', '/tmp/scanlate_cache'),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis://localhost:6379/0'),
+}
+CACHE_BACKEND = env('CACHE_BACKEND', 'locmem')
+CACHES = {
+    'default': {
+        'BACKEND': _CACHE_BACKENDS[CACHE_BACKEND][0],
+        'LOCATION': env('CACHE_LOCATION', _CACHE_BACKENDS[CACHE_BACKEND][1]),
+        'KEY_PREFIX': env('CACHE_KEY_PREFIX', ''),
+    },
+    REMANGA_CACHE: {
+        'BACKEND': env('REMANGA_CACHE_BACKEND', 'django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': env('REMANGA_CACHE_LOCATION', 'remanga_cache'),
+        'TIMEOUT': env.int('REMANGA_CACHE_MAX_AGE', 7 * 24 * 60 * 60),
+        'OPTIONS': {
+            'MAX_ENTRIES': env.int('REMANGA_CACHE_MAX_ENTRIES', 1000),
+        },
+    },
+}
+
+# Cached GET responses of read-heavy views, dropped when the models they show change
+RESPONSE_CACHE_TIMEOUT = env.int('RESPONSE_CACHE_TIMEOUT', 5 * 60)
 
 
 # Rest Framwork
@@ -122,9 +208,39 @@ REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': ['rest_framework.renderers.JSONRenderer'],
     'DEFAULT_PARSER_CLASSES': ['rest_framework.parsers.JSONParser'],
     'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.IsAuthenticated'],
-    'DEFAULT_AUTHENTICATION_CLASSES': ['scanlate.authentication.ScanlateTokenAuthentication'],
+    # Throttling keys on the address appended by the reverse proxy, a client supplied X-Forwarded-For is ignored
+    'NUM_PROXIES': env.int('NUM_PROXIES', 1),
+    'DEFAULT_THROTTLE_RATES': {
+        'login': env('LOGIN_THROTTLE_RATE', '10/min'),
+    },
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'scanlate.authentication.ScanlateAccessTokenAuthentication',
+        'scanlate.authentication.ScanlateTokenAuthentication',
+    ],
 }
 
 
+# Query profiling: always on with QUERY_PROFILER, per request with the X-Profile-Queries header
+QUERY_PROFILER = env.bool('QUERY_PROFILER', False)
+QUERY_PROFILER_HEADER = env.bool('QUERY_PROFILER_HEADER', DEBUG)
+QUERY_PROFILER_N_PLUS_ONE_THRESHOLD = env.int('QUERY_PROFILER_N_PLUS_ONE_THRESHOLD', 5)
+
+# Signed access tokens are verified without the database, refresh tokens are stored and rotated
+ACCESS_TOKEN_LIFETIME = env.int('ACCESS_TOKEN_LIFETIME', 5 * 60)
+REFRESH_TOKEN_LIFETIME = env.int('REFRESH_TOKEN_LIFETIME', 30 * 24 * 60 * 60)
+
+# Authenticated tokens are cached per process and optionally in a shared cache alias.
+# Only enabled with a shared default cache (file or redis), which holds the versions that invalidate entries.
+AUTH_TOKEN_CACHE = env.bool('AUTH_TOKEN_CACHE', True)
+AUTH_TOKEN_CACHE_SIZE = env.int('AUTH_TOKEN_CACHE_SIZE', 1024)
+AUTH_TOKEN_CACHE_TTL = env.int('AUTH_TOKEN_CACHE_TTL', 60)
+AUTH_TOKEN_SHARED_CACHE = env('AUTH_TOKEN_SHARED_CACHE', None)
+
+# Pagination counts: exact, cached or estimated (PostgreSQL planner estimates for large querysets)
+COUNT_STRATEGY = env('COUNT_STRATEGY', 'cached')
+COUNT_CACHE_TIMEOUT = env.int('COUNT_CACHE_TIMEOUT', 30)
+COUNT_ESTIMATE_THRESHOLD = env.int('COUNT_ESTIMATE_THRESHOLD', 10000)
+
+
 # CORS
 CORS_ALLOW_ALL_ORIGINS = True
@@ -0,0 +1,35 @@
+from environs import Env
+
+from backend import settings
+
+env = Env()
+env.read_env()
+
+# sync and gthread serve backend.wsgi, uvicorn_worker.UvicornWorker serves backend.asgi
+worker_class = env('GUNICORN_WORKER_CLASS', 'gthread')
+wsgi_app = 'backend.asgi:application' if 'Uvicorn' in worker_class else 'backend.wsgi:application'
+
+bind = env('GUNICORN_BIND', '0.0.0.0:8000')
+# Sized in settings, the database pool is sized against the same numbers
+workers = settings.SERVER_WORKERS
+threads = settings.SERVER_THREADS if worker_class == 'gthread' else 1
+
+# Workers fork from a preloaded app, code changes need a restart rather than HUP
+preload_app = env.bool('GUNICORN_PRELOAD', True)
+
+# Recycle workers to cap slow memory growth, jitter keeps them from restarting together
+max_requests = env.int('GUNICORN_MAX_REQUESTS', 1000)
+max_requests_jitter = env.int('GUNICORN_MAX_REQUESTS_JITTER', 100)
+
+timeout = env.int('GUNICORN_TIMEOUT', 30)
+graceful_timeout = env.int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+keepalive = env.int('GUNICORN_KEEPALIVE', 5)
+
+accesslog = env('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    # Connections must not be shared with the master process
+    from django.db import connections
+    connections.close_all()
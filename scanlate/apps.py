@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ScanlateConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'scanlate'
+
+    def ready(self):
+        from . import checks, signals
@@ -1,5 +1,165 @@
-from rest_framework.authentication import TokenAuthentication
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, TokenAuthentication, get_authorization_header
+
+from .cache import get_user_version, is_shared
+from .models import User
+from .tokens import is_access_token, verify_access_token
+
+
+def is_token_cache_supported():
+    return settings.AUTH_TOKEN_CACHE and is_shared()
+
+
+class TokenCache:
+    """In-process LRU of authenticated tokens backed by an optional shared cache.
+
+    Entries carry the user's cache version, so invalidate_users drops them in every process.
+    """
+
+    def __init__(self, size=None, ttl=None, shared_cache_alias=None):
+        self.size = size or settings.AUTH_TOKEN_CACHE_SIZE
+        self.ttl = settings.AUTH_TOKEN_CACHE_TTL if ttl is None else ttl
+        shared_cache_alias = shared_cache_alias or settings.AUTH_TOKEN_SHARED_CACHE
+        self.shared_cache = caches[shared_cache_alias] if shared_cache_alias else None
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get_shared_key(self, key):
+        return f'scanlate:auth:token:{key}'
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+        if entry is not None and entry[-1] < time.monotonic():
+            entry = None
+
+        if entry is None and self.shared_cache is not None:
+            shared_entry = self.shared_cache.get(self.get_shared_key(key))
+            if shared_entry is not None:
+                entry = (*shared_entry, time.monotonic() + self.ttl)
+                self.store(key, entry)
+
+        if entry is None:
+            return None
+        user, token, version, expires = entry
+        if version != get_user_version(user.pk):
+            self.delete(key)
+            return None
+        return copy.copy(user), token
+
+    def set(self, key, user, token, version):
+        self.store(key, (user, token, version, time.monotonic() + self.ttl))
+        if self.shared_cache is not None:
+            self.shared_cache.set(self.get_shared_key(key), (user, token, version), self.ttl)
+
+    def store(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+        if self.shared_cache is not None:
+            self.shared_cache.delete(self.get_shared_key(key))
 
 
 class ScanlateTokenAuthentication(TokenAuthentication):
     keyword = 'Bearer'
+    token_cache = None
+
+    def get_token_cache(self):
+        if not is_token_cache_supported():
+            return None
+        if ScanlateTokenAuthentication.token_cache is None:
+            ScanlateTokenAuthentication.token_cache = TokenCache()
+        return ScanlateTokenAuthentication.token_cache
+
+    def authenticate_credentials(self, key):
+        token_cache = self.get_token_cache()
+        if token_cache is None:
+            return super().authenticate_credentials(key)
+
+        cached = token_cache.get(key)
+        if cached is not None:
+            return cached
+
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, user, token, get_user_version(user.pk))
+        return user, token
+
+
+class TokenUser:
+    """User built from verified access token claims.
+
+    id, is_admin and roles come from the claims, any other attribute loads the user from the database.
+    """
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, claims):
+        object.__setattr__(self, 'id', claims['id'])
+        object.__setattr__(self, 'pk', claims['id'])
+        object.__setattr__(self, 'is_admin', claims['is_admin'])
+        object.__setattr__(self, 'roles', claims['roles'])
+        object.__setattr__(self, '_user', None)
+
+    def get_user(self):
+        if self._user is None:
+            try:
+                object.__setattr__(self, '_user', User.objects.get(pk=self.pk))
+            except User.DoesNotExist:
+                raise exceptions.AuthenticationFailed('Пользователь не найден.')
+        return self._user
+
+    def __getattr__(self, name):
+        return getattr(self.get_user(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self.get_user(), name, value)
+
+    def __eq__(self, other):
+        return isinstance(other, (User, TokenUser)) and other.pk == self.pk
+
+    def __hash__(self):
+        return hash(self.pk)
+
+
+class ScanlateAccessTokenAuthentication(BaseAuthentication):
+    """Verifies signed access tokens without touching the database, other tokens are left to the next class."""
+
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if len(auth) != 2 or auth[0].lower() != self.keyword.lower().encode():
+            return None
+
+        try:
+            token = auth[1].decode()
+        except UnicodeError:
+            return None
+        if not is_access_token(token):
+            return None
+
+        try:
+            claims = verify_access_token(token)
+        except signing.BadSignature:
+            raise exceptions.AuthenticationFailed('Токен недействителен или истек.')
+        return TokenUser(claims), token
+
+    def authenticate_header(self, request):
+        return self.keyword
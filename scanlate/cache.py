@@ -0,0 +1,64 @@
+import uuid
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+ROLES_CACHE_KEY = 'scanlate:roles'
+ROLES_CACHE_TIMEOUT = 5 * 60
+
+
+def is_shared():
+    """Cached data is invalidated through the default cache, a per-process backend can't reach other workers."""
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def get_roles():
+    if not is_shared():
+        return None
+    return cache.get(ROLES_CACHE_KEY)
+
+
+def set_roles(data):
+    if is_shared():
+        cache.set(ROLES_CACHE_KEY, data, ROLES_CACHE_TIMEOUT)
+
+
+def invalidate_roles():
+    cache.delete(ROLES_CACHE_KEY)
+
+
+def get_versions(keys):
+    versions = cache.get_many(keys)
+    for key in set(keys) - versions.keys():
+        cache.add(key, uuid.uuid4().hex, None)
+        versions[key] = cache.get(key)
+    return [versions[key] for key in sorted(keys)]
+
+
+def bump_versions(keys):
+    cache.set_many({key: uuid.uuid4().hex for key in keys}, None)
+
+
+def get_model_version_key(model):
+    return f'scanlate:version:{model._meta.label_lower}'
+
+
+def get_model_versions(models):
+    return get_versions([get_model_version_key(model) for model in models])
+
+
+def bump_model_version(model):
+    bump_versions([get_model_version_key(model)])
+
+
+def get_user_version_key(user_id):
+    return f'scanlate:version:user:{user_id}'
+
+
+def get_user_version(user_id):
+    return get_versions([get_user_version_key(user_id)])[0]
+
+
+def invalidate_users(user_ids):
+    bump_versions([get_user_version_key(user_id) for user_id in user_ids])
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+
+
+@register()
+def check_connection_budget(app_configs, **kwargs):
+    """Warns when the application server can open more database connections than the budget allows."""
+    database = settings.DATABASES['default']
+    pool = database.get('OPTIONS', {}).get('pool')
+    if pool:
+        per_worker = pool['max_size']
+    elif database.get('CONN_MAX_AGE'):
+        per_worker = settings.SERVER_THREADS
+    else:
+        return []
+
+    connections = settings.SERVER_WORKERS * per_worker
+    if connections <= settings.POSTGRES_CONNECTION_BUDGET:
+        return []
+    return [Warning(
+        f'{settings.SERVER_WORKERS} workers with {per_worker} connections each can hold {connections} '
+        f'database connections, more than POSTGRES_CONNECTION_BUDGET ({settings.POSTGRES_CONNECTION_BUDGET}).',
+        hint='Lower GUNICORN_WORKERS or GUNICORN_THREADS, or enable POSTGRES_POOL with a smaller pool.',
+        id='scanlate.W001',
+    )]
@@ -0,0 +1,79 @@
+import hashlib
+import json
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from .cache import get_model_versions, is_shared
+
+
+class ExactCounter:
+    def count(self, queryset):
+        return queryset.count(), True
+
+
+class CachedCounter(ExactCounter):
+    def __init__(self, timeout=None):
+        self.timeout = settings.COUNT_CACHE_TIMEOUT if timeout is None else timeout
+
+    def get_cache_key(self, queryset):
+        models_by_table = {model._meta.db_table: model for model in apps.get_models()}
+        models = [models_by_table[table.table_name] for table in queryset.query.alias_map.values()
+                  if table.table_name in models_by_table]
+        sql, params = queryset.query.sql_with_params()
+        key = repr((sql, params, get_model_versions(models)))
+        return 'scanlate:count:' + hashlib.md5(key.encode()).hexdigest()
+
+    def count(self, queryset):
+        if not is_shared():
+            return super().count(queryset)
+        cache_key = self.get_cache_key(queryset)
+        count = cache.get(cache_key)
+        if count is None:
+            count = super().count(queryset)[0]
+            cache.set(cache_key, count, self.timeout)
+        return count, True
+
+
+class EstimatedCounter(CachedCounter):
+    def __init__(self, timeout=None, threshold=None):
+        super().__init__(timeout)
+        self.threshold = settings.COUNT_ESTIMATE_THRESHOLD if threshold is None else threshold
+
+    def estimate(self, queryset):
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+
+        query = queryset.query
+        if not query.where and not query.distinct and not query.group_by:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                               [queryset.model._meta.db_table])
+                row = cursor.fetchone()
+            # reltuples is -1 until the table has been vacuumed or analyzed
+            return row[0] if row and row[0] >= 0 else None
+
+        plan = json.loads(queryset.explain(format='json'))
+        if isinstance(plan, list):
+            plan = plan[0]
+        return plan['Plan']['Plan Rows']
+
+    def count(self, queryset):
+        estimate = self.estimate(queryset)
+        if estimate is not None and estimate >= self.threshold:
+            return estimate, False
+        return super().count(queryset)
+
+
+COUNTERS = {
+    'exact': ExactCounter,
+    'cached': CachedCounter,
+    'estimated': EstimatedCounter,
+}
+
+
+def get_counter(strategy=None):
+    return COUNTERS[strategy or settings.COUNT_STRATEGY]()
@@ -10,5 +10,6 @@ def scanlate_exception_handler(exc, context):
         if isinstance(response.data, dict):
             msg = response.data.pop('detail', '')
 
-        return ScanlateResponse(errors=response.data, msg=msg, status=response.status_code)
+        return ScanlateResponse(errors=response.data, msg=msg, status=response.status_code,
+                                headers={name: value for name, value in response.items() if name == 'Retry-After'})
     return response
@@ -1,3 +1,7 @@
+from datetime import datetime, time
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from rest_framework.filters import BaseFilterBackend
 
 
@@ -7,9 +11,26 @@ def query_param_to_bool(query_param):
     return query_param.isdigit() and bool(int(query_param))
 
 
+def query_param_to_date(query_param):
+    try:
+        return parse_date(query_param or '')
+    except ValueError:
+        return None
+
+
+def query_param_to_datetime(query_param):
+    date = query_param_to_date(query_param)
+    if date is None:
+        return None
+    return datetime.combine(date, time.min, tzinfo=timezone.get_current_timezone())
+
+
 class UserFilterBackend(BaseFilterBackend):
     def filter_queryset(self, request, queryset, view):
         if view.action == 'list':
+            roles = [int(role) for role in request.query_params.get('roles', '').split(',') if role.isdigit()]
+            if roles:
+                queryset = queryset.filter(roles__overlap=roles)
             return queryset.order_by('username')
         return queryset
 
@@ -35,3 +56,43 @@ class ChapterFilterBackend(BaseFilterBackend):
 
             return queryset
         return queryset
+
+
+class PaymentFilterBackend(BaseFilterBackend):
+    def filter_queryset(self, request, queryset, view):
+        user_id = request.query_params.get('user_id')
+        if user_id is not None and user_id.isdigit() and request.user.is_admin:
+            queryset = queryset.filter(user_id=int(user_id))
+        else:
+            queryset = queryset.filter(user_id=request.user.pk)
+
+        payment_type = request.query_params.get('type')
+        if payment_type is not None and payment_type.isdigit():
+            queryset = queryset.filter(type=int(payment_type))
+
+        date_from = query_param_to_datetime(request.query_params.get('date_from'))
+        if date_from is not None:
+            queryset = queryset.filter(datetime__gte=date_from)
+
+        date_to = query_param_to_datetime(request.query_params.get('date_to'))
+        if date_to is not None:
+            queryset = queryset.filter(datetime__lt=date_to + timezone.timedelta(days=1))
+
+        return queryset
+
+
+class ReleaseCalendarFilterBackend(BaseFilterBackend):
+    def filter_queryset(self, request, queryset, view):
+        title_id = request.query_params.get('title_id')
+        if title_id is not None:
+            queryset = queryset.filter(title_id=title_id)
+
+        date_from = query_param_to_date(request.query_params.get('date_from'))
+        if date_from is not None:
+            queryset = queryset.filter(release_date__gte=date_from)
+
+        date_to = query_param_to_date(request.query_params.get('date_to'))
+        if date_to is not None:
+            queryset = queryset.filter(release_date__lte=date_to)
+
+        return queryset
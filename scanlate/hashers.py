@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher, ScryptPasswordHasher
+
+
+class ScanlateScryptPasswordHasher(ScryptPasswordHasher):
+    """Scrypt with costs from settings, hashes made with other costs are upgraded on login."""
+
+    work_factor = settings.PASSWORD_SCRYPT_WORK_FACTOR
+    block_size = settings.PASSWORD_SCRYPT_BLOCK_SIZE
+    parallelism = settings.PASSWORD_SCRYPT_PARALLELISM
+    maxmem = 4 * 128 * work_factor * block_size
+
+
+class ScanlateArgon2PasswordHasher(Argon2PasswordHasher):
+    """Argon2 with costs from settings, requires argon2-cffi."""
+
+    time_cost = settings.PASSWORD_ARGON2_TIME_COST
+    memory_cost = settings.PASSWORD_ARGON2_MEMORY_COST
+    parallelism = settings.PASSWORD_ARGON2_PARALLELISM
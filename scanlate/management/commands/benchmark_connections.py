@@ -0,0 +1,83 @@
+import copy
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections
+from django.db.backends.signals import connection_created
+from django.test import Client, override_settings
+
+MODES = {
+    'per-request': {'CONN_MAX_AGE': 0, 'OPTIONS': {}},
+    'persistent': {'CONN_MAX_AGE': None, 'CONN_HEALTH_CHECKS': True, 'OPTIONS': {}},
+    'pool': {'CONN_MAX_AGE': 0, 'OPTIONS': {'pool': {'min_size': 1, 'max_size': 1}}},
+    'configured': {},
+}
+
+
+def measure(path, requests, headers):
+    """Sends requests through Django's handler, closing connections like a real server would.
+
+    The test client disconnects close_old_connections from request_started/request_finished,
+    so it is called around every request the same way those signals do.
+    """
+    opened = []
+
+    def on_connection_created(sender, connection, **kwargs):
+        opened.append(connection.alias)
+
+    connection_created.connect(on_connection_created)
+    try:
+        client = Client(headers=headers)
+        latencies = []
+        for _ in range(requests):
+            started = time.perf_counter()
+            close_old_connections()
+            client.get(path)
+            close_old_connections()
+            latencies.append(time.perf_counter() - started)
+    finally:
+        connection_created.disconnect(on_connection_created)
+        connections.close_all()
+    return latencies, len(opened)
+
+
+class Command(BaseCommand):
+    help = 'Compares per-request latency with new, persistent and pooled database connections.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/titles', help='Endpoint to request.')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per mode.')
+        parser.add_argument('--token', help='Bearer token for authenticated endpoints.')
+        parser.add_argument('--mode', action='append', dest='modes', choices=MODES.keys(),
+                            help='Connection modes to compare, all by default.')
+
+    def handle(self, *args, **options):
+        headers = {'Authorization': f'Bearer {options["token"]}'} if options['token'] else {}
+        settings_dict = connections.settings[DEFAULT_DB_ALIAS]
+        original = copy.deepcopy(settings_dict)
+
+        for mode in options['modes'] or MODES.keys():
+            settings_dict.update(copy.deepcopy(MODES[mode]))
+            try:
+                # Connections are per thread, a fresh thread builds one from the updated settings.
+                # Cached responses would skip the database, so nothing is cached while measuring.
+                with ThreadPoolExecutor(1) as executor, override_settings(RESPONSE_CACHE_TIMEOUT=0):
+                    latencies, opened = executor.submit(
+                        measure, options['path'], options['requests'], headers
+                    ).result()
+            except Exception as e:
+                self.stdout.write(self.style.WARNING(f'{mode}: skipped ({e})'))
+                continue
+            finally:
+                settings_dict.clear()
+                settings_dict.update(copy.deepcopy(original))
+
+            latencies.sort()
+            self.stdout.write(
+                f'{mode}: mean {statistics.mean(latencies) * 1000:.2f} ms, '
+                f'p50 {statistics.median(latencies) * 1000:.2f} ms, '
+                f'p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.2f} ms, '
+                f'{opened} connections opened'
+            )
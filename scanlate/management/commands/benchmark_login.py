@@ -0,0 +1,52 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+PASSWORD = 'benchmark-password'
+
+
+def verify_many(algorithm, encoded, count):
+    hasher = get_hasher(algorithm)
+    for _ in range(count):
+        hasher.verify(PASSWORD, encoded)
+    return count
+
+
+class Command(BaseCommand):
+    help = 'Measures how many password checks per second the configured hashers can do.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=50, help='Password checks per process.')
+        parser.add_argument('--processes', type=int, default=os.cpu_count(),
+                            help='Processes checking passwords in parallel.')
+        parser.add_argument('--hasher', action='append', dest='hashers',
+                            help='Hasher algorithm to measure, all configured hashers by default.')
+
+    def handle(self, *args, **options):
+        algorithms = options['hashers'] or [import_string(path).algorithm for path in settings.PASSWORD_HASHERS]
+        for algorithm in algorithms:
+            try:
+                hasher = get_hasher(algorithm)
+                encoded = hasher.encode(PASSWORD, hasher.salt())
+            except (ValueError, ImportError) as e:
+                self.stdout.write(self.style.WARNING(f'{algorithm}: skipped ({e})'))
+                continue
+
+            started = time.perf_counter()
+            verify_many(algorithm, encoded, options['logins'])
+            per_core = options['logins'] / (time.perf_counter() - started)
+
+            started = time.perf_counter()
+            processes = options['processes']
+            with ProcessPoolExecutor(processes) as executor:
+                total = sum(executor.map(verify_many, [algorithm] * processes, [encoded] * processes,
+                                         [options['logins']] * processes))
+            throughput = total / (time.perf_counter() - started)
+
+            self.stdout.write(f'{algorithm}: {per_core:.1f} logins/s per core, '
+                              f'{throughput:.1f} logins/s with {processes} processes')
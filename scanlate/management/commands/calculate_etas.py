@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from scanlate.models import Chapter
+
+
+class Command(BaseCommand):
+    help = 'Projects expected dates for every remaining role of unfinished chapters.'
+
+    def handle(self, *args, **options):
+        changed = Chapter.objects.calculate_etas()
+        self.stdout.write(self.style.SUCCESS(f'Updated {len(changed)} expected dates.'))
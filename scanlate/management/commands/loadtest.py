@@ -0,0 +1,68 @@
+import asyncio
+import statistics
+import time
+
+import httpx
+from django.core.management.base import BaseCommand
+
+
+async def run_target(base_url, paths, requests, concurrency, headers):
+    latencies = []
+    errors = 0
+    sent = 0
+
+    async with httpx.AsyncClient(base_url=base_url, headers=headers,
+                                 limits=httpx.Limits(max_connections=concurrency)) as client:
+        async def worker():
+            nonlocal errors, sent
+            while sent < requests:
+                path = paths[sent % len(paths)]
+                sent += 1
+                started = time.perf_counter()
+                try:
+                    response = await client.get(path)
+                    if response.status_code >= 400:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'throughput': len(latencies) / elapsed,
+        'errors': errors,
+        'p50': statistics.median(latencies) * 1000,
+        'p95': latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        'p99': latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+class Command(BaseCommand):
+    help = 'Sends concurrent GET requests to one or more running servers and compares their throughput.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('base_urls', nargs='+',
+                            help='Servers to compare, e.g. a runserver and a gunicorn instance.')
+        parser.add_argument('--path', action='append', dest='paths',
+                            help='Paths to request in turn, /api/healthcheck/ by default.')
+        parser.add_argument('--requests', type=int, default=1000, help='Requests per server.')
+        parser.add_argument('--concurrency', type=int, default=20, help='Requests in flight at once.')
+        parser.add_argument('--token', help='Bearer token for authenticated endpoints.')
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or ['/api/healthcheck/']
+        headers = {'Authorization': f'Bearer {options["token"]}'} if options['token'] else {}
+
+        baseline = None
+        for base_url in options['base_urls']:
+            result = asyncio.run(run_target(base_url, paths, options['requests'], options['concurrency'], headers))
+            baseline = baseline or result['throughput']
+            self.stdout.write(
+                f'{base_url}: {result["throughput"]:.1f} req/s ({result["throughput"] / baseline:.2f}x), '
+                f'p50 {result["p50"]:.1f} ms, p95 {result["p95"]:.1f} ms, p99 {result["p99"]:.1f} ms, '
+                f'{result["errors"]} errors'
+            )
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from scanlate.models import RefreshToken
+
+
+class Command(BaseCommand):
+    help = 'Deletes expired refresh tokens.'
+
+    def handle(self, *args, **options):
+        deleted = RefreshToken.objects.prune()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} refresh tokens.'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from scanlate.models import Chapter
+
+
+class Command(BaseCommand):
+    help = ('Recalculates deadlines of pending workers of unfinished chapters. '
+            'Title updates already copy changed days for work of templates into pending workers.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('slugs', nargs='*', help='Only recalculate chapters of titles with these slugs.')
+
+    def handle(self, *args, **options):
+        chapters = Chapter.objects.filter(end_date=None)
+        if options['slugs']:
+            chapters = chapters.filter(title__slug__in=options['slugs'])
+
+        changed = Chapter.objects.calculate_deadlines(chapters)
+        self.stdout.write(self.style.SUCCESS(f'Updated {len(changed)} deadlines.'))
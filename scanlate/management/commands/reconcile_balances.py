@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from scanlate.models import BalanceSnapshot, User
+
+
+class Command(BaseCommand):
+    help = 'Compares user balances with the payment ledger and reports drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Recompute balances from all payments instead of the last snapshots.')
+        parser.add_argument('--fix', action='store_true', help='Correct drifted balances.')
+
+    def handle(self, *args, **options):
+        drifts = BalanceSnapshot.objects.reconcile(full=options['full'])
+        for user_id, username, balance, expected in drifts:
+            self.stdout.write(f'{username} (id={user_id}): balance {balance}, expected {expected}, '
+                              f'drift {balance - expected}')
+            if options['fix']:
+                User.objects.filter(pk=user_id).update(balance=F('balance') - (balance - expected))
+
+        if not drifts:
+            self.stdout.write(self.style.SUCCESS('No drift found.'))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS(f'Fixed {len(drifts)} balances.'))
+        else:
+            self.stdout.write(self.style.WARNING(f'Found {len(drifts)} drifted balances.'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from scanlate.models import BalanceSnapshot
+
+
+class Command(BaseCommand):
+    help = 'Stores balance snapshots of users who received payments since their last snapshot.'
+
+    def handle(self, *args, **options):
+        snapshots = BalanceSnapshot.objects.take()
+        self.stdout.write(self.style.SUCCESS(f'Stored {len(snapshots)} snapshots.'))
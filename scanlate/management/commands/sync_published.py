@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from scanlate.parser import sync_published, SYNC_MAX_WORKERS
+from scanlate.models import Title
+
+
+class Command(BaseCommand):
+    help = 'Publishes chapters of active titles that are already published on Remanga.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('slugs', nargs='*', help='Only sync titles with these slugs.')
+        parser.add_argument('--workers', type=int, default=SYNC_MAX_WORKERS,
+                            help='Maximum number of concurrent requests to Remanga.')
+
+    def handle(self, *args, **options):
+        titles = Title.objects.filter(is_active=True)
+        if options['slugs']:
+            titles = titles.filter(slug__in=options['slugs'])
+
+        chapters = sync_published(titles, max_workers=options['workers'])
+        self.stdout.write(self.style.SUCCESS(f'Published {len(chapters)} chapters.'))
@@ -0,0 +1,117 @@
+import json
+import logging
+import os
+import re
+import sys
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from rest_framework.serializers import BaseSerializer
+
+logger = logging.getLogger('scanlate.queries')
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+IN_LIST_RE = re.compile(r'IN \((?:%s, )*%s\)')
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+def get_fingerprint(sql):
+    # Queries differing only by parameters or by the length of an IN list share a fingerprint
+    return IN_LIST_RE.sub('IN (...)', WHITESPACE_RE.sub(' ', sql))
+
+
+def get_origin():
+    """Returns the innermost serializer and scanlate frame that led to the current query."""
+    serializer = caller = None
+    frame = sys._getframe(2)
+    while frame is not None and (serializer is None or caller is None):
+        if serializer is None and isinstance(frame.f_locals.get('self'), BaseSerializer):
+            serializer = type(frame.f_locals['self']).__name__
+        filename = frame.f_code.co_filename
+        if caller is None and filename.startswith(PACKAGE_DIR) and filename != __file__:
+            caller = f'{frame.f_globals.get("__name__")}.{frame.f_code.co_qualname}:{frame.f_lineno}'
+        frame = frame.f_back
+    return serializer, caller
+
+
+class QueryProfile:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0
+        self.fingerprints = Counter()
+        self.origins = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            fingerprint = get_fingerprint(sql)
+            self.fingerprints[fingerprint] += 1
+            if self.fingerprints[fingerprint] == 2:
+                self.origins[fingerprint] = get_origin()
+
+    def get_repeated(self):
+        return [(fingerprint, count, *self.origins[fingerprint])
+                for fingerprint, count in self.fingerprints.most_common() if count > 1]
+
+
+class QueryProfilerMiddleware:
+    """Counts queries of a request and reports them in X-Query-* headers and the scanlate.queries log.
+
+    Runs for every request when QUERY_PROFILER is on, or for requests with the X-Profile-Queries header
+    when QUERY_PROFILER_HEADER is on.
+    """
+
+    header = 'HTTP_X_PROFILE_QUERIES'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def is_enabled(self, request):
+        return settings.QUERY_PROFILER or (settings.QUERY_PROFILER_HEADER and self.header in request.META)
+
+    def __call__(self, request):
+        if not self.is_enabled(request):
+            return self.get_response(request)
+
+        profile = QueryProfile()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(profile))
+            response = self.get_response(request)
+
+        self.report(request, response, profile)
+        return response
+
+    def report(self, request, response, profile):
+        repeated = profile.get_repeated()
+        response['X-Query-Count'] = profile.count
+        response['X-Query-Time'] = f'{profile.duration * 1000:.1f}'
+        response['X-Query-Repeated'] = len(repeated)
+
+        view = request.resolver_match._func_path if request.resolver_match else None
+        suspects = [
+            {'fingerprint': fingerprint, 'count': count, 'serializer': serializer, 'caller': caller}
+            for fingerprint, count, serializer, caller in repeated
+            if count >= settings.QUERY_PROFILER_N_PLUS_ONE_THRESHOLD
+        ]
+        log = {
+            'method': request.method,
+            'path': request.path,
+            'view': view,
+            'status': response.status_code,
+            'queries': profile.count,
+            'db_time_ms': round(profile.duration * 1000, 1),
+            'repeated': len(repeated),
+            'n_plus_one': suspects,
+        }
+        if suspects:
+            logger.warning('Possible N+1 queries: %s', json.dumps(log, ensure_ascii=False))
+        else:
+            logger.info('Queries: %s', json.dumps(log, ensure_ascii=False))
@@ -0,0 +1,116 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:39
+
+import django.contrib.auth.validators
+import django.contrib.postgres.fields
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='User',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('password', models.CharField(max_length=128, verbose_name='password')),
+                ('last_login', models.DateTimeField(blank=True, null=True, verbose_name='last login')),
+                ('username', models.CharField(max_length=150, unique=True, validators=[django.contrib.auth.validators.UnicodeUsernameValidator])),
+                ('is_admin', models.BooleanField(default=False)),
+                ('roles', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(choices=[(0, 'Curator'), (1, 'Raw Provider'), (2, 'Cleaner'), (3, 'Translator'), (4, 'Typesetter'), (5, 'Quality Checker')]), blank=True, default=list, size=None)),
+                ('balance', models.IntegerField(default=0)),
+                ('discord_id', models.PositiveBigIntegerField(null=True)),
+                ('vk_id', models.PositiveBigIntegerField(null=True)),
+                ('status', models.IntegerField(choices=[(0, 'Marathon'), (1, 'Ongoing'), (2, 'Enough'), (3, 'Vacation')], null=True)),
+                ('telegram', models.URLField(null=True)),
+            ],
+            options={
+                'ordering': ['username'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Title',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=300)),
+                ('raw_name', models.CharField(max_length=300, null=True)),
+                ('slug', models.SlugField(max_length=300, unique=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('ad_date', models.DateField(default=None, null=True)),
+                ('raw', models.URLField(null=True)),
+                ('discord_channel', models.URLField(null=True)),
+                ('img', models.URLField(null=True)),
+                ('release_frequency', models.IntegerField(choices=[(0, 'Daily'), (1, 'Weekly'), (2, 'Biweekly'), (3, 'Monthly')])),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Chapter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tome', models.IntegerField()),
+                ('chapter', models.FloatField()),
+                ('pages', models.IntegerField()),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField(null=True)),
+                ('is_published', models.BooleanField(default=False)),
+                ('title', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chapters', to='scanlate.title')),
+            ],
+            options={
+                'ordering': ['tome', 'chapter'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Worker',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.IntegerField(choices=[(0, 'Curator'), (1, 'Raw Provider'), (2, 'Cleaner'), (3, 'Translator'), (4, 'Typesetter'), (5, 'Quality Checker')])),
+                ('rate', models.IntegerField(default=100)),
+                ('is_paid_by_pages', models.BooleanField()),
+                ('days_for_work', models.IntegerField()),
+                ('deadline', models.DateField(null=True)),
+                ('upload_time', models.DateTimeField(null=True)),
+                ('url', models.URLField(blank=True, null=True)),
+                ('is_done', models.BooleanField(default=False)),
+                ('chapter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='workers', to='scanlate.chapter')),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['role'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Payment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.IntegerField()),
+                ('datetime', models.DateTimeField()),
+                ('type', models.IntegerField(choices=[(0, 'In'), (1, 'Out')])),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('worker', models.ForeignKey(default=None, null=True, on_delete=django.db.models.deletion.SET_NULL, to='scanlate.worker')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='WorkerTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.IntegerField(choices=[(0, 'Curator'), (1, 'Raw Provider'), (2, 'Cleaner'), (3, 'Translator'), (4, 'Typesetter'), (5, 'Quality Checker')])),
+                ('rate', models.IntegerField(default=100)),
+                ('is_paid_by_pages', models.BooleanField(default=False)),
+                ('days_for_work', models.IntegerField(default=2)),
+                ('title', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='workers', to='scanlate.title')),
+                ('user', models.ForeignKey(default=None, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['role'],
+            },
+        ),
+    ]
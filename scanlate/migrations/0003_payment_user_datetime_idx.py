@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanlate', '0002_balancesnapshot'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['user', '-datetime', '-id'], include=('amount', 'type', 'worker'), name='payment_user_datetime_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanlate', '0003_payment_user_datetime_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='title',
+            name='workflow',
+            field=models.JSONField(blank=True, default=None, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanlate', '0004_title_workflow'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='worker',
+            name='eta',
+            field=models.DateField(null=True),
+        ),
+    ]
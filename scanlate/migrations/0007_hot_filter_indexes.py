@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:39
+
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanlate', '0006_refreshtoken'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='chapter',
+            name='title',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='chapters', to='scanlate.title'),
+        ),
+        migrations.AlterField(
+            model_name='worker',
+            name='chapter',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='workers', to='scanlate.chapter'),
+        ),
+        migrations.AlterField(
+            model_name='worker',
+            name='user',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='workertemplate',
+            name='title',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='workers', to='scanlate.title'),
+        ),
+        migrations.AddIndex(
+            model_name='chapter',
+            index=models.Index(fields=['title', 'is_published', 'tome', 'chapter'], name='chapter_title_published_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['roles'], name='user_roles_gin_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='worker',
+            index=models.Index(fields=['user', 'is_done', 'deadline'], name='worker_user_done_deadline_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='worker',
+            index=models.Index(condition=models.Q(('is_done', False)), fields=['user', 'deadline'], name='worker_user_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='worker',
+            index=models.Index(fields=['chapter', 'role'], name='worker_chapter_role_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workertemplate',
+            index=models.Index(fields=['title', 'user', 'role'], name='workertemplate_title_user_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+from django.db import migrations
+from django.db.models import F
+
+
+def get_duplicates(queryset, fields, ordering):
+    """Returns ids of every row except the first one of each group, rows are ordered by preference."""
+    kept, duplicates = {}, []
+    for row in queryset.order_by(*fields, *ordering).values('id', *fields):
+        group = tuple(row[field] for field in fields)
+        if group in kept:
+            duplicates.append((row['id'], kept[group]))
+        else:
+            kept[group] = row['id']
+    return duplicates
+
+
+def dedupe_roles(apps, schema_editor):
+    Worker = apps.get_model('scanlate', 'Worker')
+    WorkerTemplate = apps.get_model('scanlate', 'WorkerTemplate')
+    Payment = apps.get_model('scanlate', 'Payment')
+
+    # The worker with the most progress is kept, payments of the others are moved to it
+    duplicates = get_duplicates(Worker.objects.all(), ['chapter_id', 'role'],
+                                [F('is_done').desc(), F('upload_time').desc(nulls_last=True), 'id'])
+    for worker_id, kept_id in duplicates:
+        Payment.objects.filter(worker_id=worker_id).update(worker_id=kept_id)
+    Worker.objects.filter(id__in=[worker_id for worker_id, _ in duplicates]).delete()
+
+    duplicates = get_duplicates(WorkerTemplate.objects.all(), ['title_id', 'role'],
+                                [F('user_id').asc(nulls_last=True), 'id'])
+    WorkerTemplate.objects.filter(id__in=[template_id for template_id, _ in duplicates]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanlate', '0007_hot_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_roles, migrations.RunPython.noop),
+    ]
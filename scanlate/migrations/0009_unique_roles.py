@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanlate', '0008_dedupe_roles'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='worker',
+            name='worker_chapter_role_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='worker',
+            constraint=models.UniqueConstraint(fields=('chapter', 'role'), name='worker_chapter_role_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='workertemplate',
+            constraint=models.UniqueConstraint(fields=('title', 'role'), name='workertemplate_title_role_unique'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+import functools
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+
+from .cache import get_model_versions, is_shared
+from .models import Role
+
+
+def cache_response(method):
+    """Caches successful responses of a view method under ResponseCacheMixin.get_response_cache_key."""
+
+    @functools.wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        if not is_shared():
+            return method(self, request, *args, **kwargs)
+        cache_key = self.get_response_cache_key(request)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            response = Response(cached)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        response = method(self, request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(cache_key, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    return wrapper
+
+
+class ResponseCacheMixin:
+    # Models whose writes must drop the cached responses
+    response_cache_models = ()
+
+    def get_response_cache_bucket(self):
+        """Users in the same bucket get the same response."""
+        user = self.request.user
+        if user.is_authenticated and (user.is_admin or Role.CURATOR in user.roles):
+            return 'staff'
+        if user.is_authenticated:
+            return f'user:{user.pk}'
+        return 'anonymous'
+
+    def get_response_cache_key(self, request):
+        key = repr((
+            request.path,
+            sorted(request.query_params.lists()),
+            self.action,
+            self.get_response_cache_bucket(),
+            get_model_versions(self.response_cache_models),
+        ))
+        return 'scanlate:response:' + hashlib.md5(key.encode()).hexdigest()
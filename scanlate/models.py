@@ -1,8 +1,16 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction, connection
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager
 from django.contrib.auth.validators import UnicodeUsernameValidator
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
 from django.utils import timezone
+from collections import defaultdict
+from functools import lru_cache
+import hashlib
+import secrets
+
+from .cache import bump_model_version, invalidate_users
 
 
 class Status(models.IntegerChoices):
@@ -42,6 +50,80 @@ class RoleExtra:
     last_role = Role.QUALITY_CHECKER
 
 
+class Workflow:
+    """Compiled workflow, role sets are stored as bitsets where role r is bit 1 << r."""
+
+    def __init__(self, definition):
+        self.dependencies = {role: dependencies for role, dependencies in definition}
+        self.roles = self.sort_roles()
+        self.continuations = {role: tuple(continuation for continuation in self.roles
+                                          if role in self.dependencies[continuation])
+                              for role in self.roles}
+
+        self.mask = self.mask_of(self.roles)
+        self.predecessors = {role: self.mask_of(self.dependencies[role]) for role in self.roles}
+        self.successors = {role: self.mask_of(self.continuations[role]) for role in self.roles}
+
+        self.first_roles = frozenset(role for role in self.roles if self.dependencies[role] == (Role.CURATOR,))
+        self.last_roles = frozenset(role for role in self.roles if not self.continuations[role])
+        self.last_mask = self.mask_of(self.last_roles)
+
+    def sort_roles(self):
+        if Role.CURATOR not in self.dependencies or self.dependencies[Role.CURATOR]:
+            raise ValueError('Куратор должен быть в процессе и не иметь зависимостей.')
+        for role, dependencies in self.dependencies.items():
+            if role not in Role.values:
+                raise ValueError(f'Нет роли {role}.')
+            if role != Role.CURATOR and not dependencies:
+                raise ValueError(f'У роли {role} нет зависимостей.')
+            for dependency in dependencies:
+                if dependency not in self.dependencies:
+                    raise ValueError(f'Роль {role} зависит от роли {dependency}, которой нет в процессе.')
+
+        roles = []
+        remaining = dict(self.dependencies)
+        while remaining:
+            ready = sorted(role for role, dependencies in remaining.items()
+                           if all(dependency in roles for dependency in dependencies))
+            if not ready:
+                raise ValueError('В процессе есть цикл.')
+            roles.extend(ready)
+            for role in ready:
+                del remaining[role]
+        return tuple(roles)
+
+    @staticmethod
+    def mask_of(roles):
+        mask = 0
+        for role in roles:
+            mask |= 1 << role
+        return mask
+
+    def is_ready(self, role, done_mask):
+        return not self.predecessors[role] & ~done_mask
+
+    def is_finished(self, done_mask):
+        return not self.last_mask & ~done_mask
+
+
+def normalize_definition(dependencies):
+    return tuple(sorted(
+        (int(role), tuple(sorted(int(dependency) for dependency in role_dependencies)))
+        for role, role_dependencies in dependencies.items()
+    ))
+
+
+@lru_cache(maxsize=128)
+def compile_workflow(definition):
+    return Workflow(definition)
+
+
+def get_workflow(dependencies=None):
+    if dependencies is None:
+        dependencies = RoleExtra.dependencies
+    return compile_workflow(normalize_definition(dependencies))
+
+
 class PaymentType(models.IntegerChoices):
     IN = 0
     OUT = 1
@@ -54,7 +136,29 @@ class ReleaseFrequency(models.IntegerChoices):
     MONTHLY = 3
 
 
-class UserManager(BaseUserManager):
+class ScanlateQuerySet(models.QuerySet):
+    """Bumps the model cache version on bulk writes, which don't send post_save signals."""
+
+    def update(self, **kwargs):
+        rows = super().update(**kwargs)
+        bump_model_version(self.model)
+        return rows
+
+    def bulk_create(self, *args, **kwargs):
+        objs = super().bulk_create(*args, **kwargs)
+        bump_model_version(self.model)
+        return objs
+
+    def bulk_update(self, *args, **kwargs):
+        rows = super().bulk_update(*args, **kwargs)
+        bump_model_version(self.model)
+        return rows
+
+
+ScanlateManager = models.Manager.from_queryset(ScanlateQuerySet)
+
+
+class UserManager(BaseUserManager.from_queryset(ScanlateQuerySet)):
     def create(self, username, password, roles):
         username = AbstractBaseUser.normalize_username(username)
         user = self.model(username=username, roles=roles)
@@ -63,59 +167,306 @@ class UserManager(BaseUserManager):
         return user
 
 
-class TitleManager(models.Manager):
+class TitleManager(ScanlateManager):
     def create(self, name, slug, img, **kwargs):
         title = super().create(name=name, slug=slug, img=img, **kwargs)
         return title
 
 
-class ChapterManager(models.Manager):
+class ChapterManager(ScanlateManager):
     def create(self, title, tome, chapter, pages, start_date=None):
-        if start_date is None:
-            start_date = timezone.localdate() + timezone.timedelta(days=1)
-
-        chapter = super().create(
-            title=title,
-            tome=tome,
-            chapter=chapter,
-            pages=pages,
-            start_date=start_date
+        return self.create_many(title, [{'tome': tome, 'chapter': chapter, 'pages': pages, 'start_date': start_date}])[0]
+
+    def create_many(self, title, chapters_data):
+        default_start_date = timezone.localdate() + timezone.timedelta(days=1)
+        templates = list(title.workers.all())
+        continuations = title.get_workflow().continuations[Role.CURATOR]
+
+        with transaction.atomic():
+            chapters = self.bulk_create([
+                self.model(
+                    title=title,
+                    tome=chapter_data.get('tome'),
+                    chapter=chapter_data.get('chapter'),
+                    pages=chapter_data.get('pages'),
+                    start_date=chapter_data.get('start_date') or default_start_date
+                )
+                for chapter_data in chapters_data
+            ])
+
+            to_create = []
+            for chapter in chapters:
+                workers = [template.make_worker(chapter, is_done=template.role == Role.CURATOR)
+                           for template in templates]
+                chapter.get_changed_deadlines(workers, continuations)
+                chapter.get_changed_etas(workers)
+                to_create.extend(workers)
+            Worker.objects.bulk_create(to_create)
+        return chapters
+
+    def calculate_deadlines(self, chapters):
+        changed = set()
+        chapters = self.filter(pk__in=[chapter.pk for chapter in chapters]).select_related('title')
+        for chapter in chapters.prefetch_related('workers'):
+            workers = chapter.workers.all()
+            roles = [worker.role for worker in workers if not worker.is_done]
+            changed.update(chapter.get_changed_deadlines(workers, roles))
+            changed.update(chapter.get_changed_etas(workers))
+        Worker.objects.bulk_update(changed, ['deadline', 'eta'])
+        return changed
+
+    def apply_workflow(self, title, days_for_work=None):
+        """Brings the workers of unfinished chapters in line with the title's workflow and templates.
+
+        Pending workers of dropped roles are deleted, done ones are kept to be paid. Added roles get workers
+        from the templates. days_for_work maps roles to new template values for pending workers.
+        Chapters left with only done roles are ended, the others get recalculated deadlines.
+        """
+        workflow = title.get_workflow()
+        templates = list(WorkerTemplate.objects.filter(title=title))
+        with transaction.atomic():
+            chapters = list(self.filter(title=title, end_date=None).select_related('title'))
+            if not chapters:
+                return chapters
+            pending = Worker.objects.filter(chapter__in=chapters, is_done=False)
+            pending.exclude(role__in=workflow.roles).delete()
+            for role, days in (days_for_work or {}).items():
+                pending.filter(role=role).update(days_for_work=days)
+
+            done_roles = defaultdict(set)
+            existing = set()
+            for chapter_id, role, is_done in Worker.objects.filter(chapter__in=chapters).values_list(
+                    'chapter_id', 'role', 'is_done'):
+                existing.add((chapter_id, role))
+                if is_done:
+                    done_roles[chapter_id].add(role)
+            Worker.objects.bulk_create([template.make_worker(chapter) for chapter in chapters for template in templates
+                                        if (chapter.pk, template.role) not in existing])
+
+            finished = [chapter.pk for chapter in chapters
+                        if workflow.is_finished(workflow.mask_of(done_roles[chapter.pk]))]
+            self.filter(pk__in=finished).update(end_date=timezone.localdate())
+            self.calculate_deadlines([chapter for chapter in chapters if chapter.pk not in finished])
+        return chapters
+
+    def calculate_etas(self, chapters=None):
+        if chapters is None:
+            chapters = self.filter(end_date=None)
+        else:
+            chapters = self.filter(pk__in=[chapter.pk for chapter in chapters])
+
+        changed = []
+        for chapter in chapters.select_related('title').prefetch_related('workers'):
+            changed.extend(chapter.get_changed_etas(chapter.workers.all()))
+        Worker.objects.bulk_update(changed, ['eta'])
+        return changed
+
+    def publish(self, chapters):
+        chapter_ids = [chapter.pk for chapter in chapters]
+        if not chapter_ids:
+            return []
+
+        with transaction.atomic():
+            chapters = list(self.select_for_update(of=('self',)).select_related('title')
+                            .filter(pk__in=chapter_ids, is_published=False))
+            pending_roles = defaultdict(set)
+            for chapter_id, role in Worker.objects.filter(chapter__in=chapters, is_done=False).values_list(
+                    'chapter_id', 'role'):
+                pending_roles[chapter_id].add(role)
+            # Only roles of the current workflow have to be done
+            chapters = [chapter for chapter in chapters
+                        if not pending_roles[chapter.pk].intersection(chapter.title.get_workflow().roles)]
+            if not chapters:
+                return []
+            self.filter(pk__in=[chapter.pk for chapter in chapters]).update(is_published=True)
+
+            pages = {chapter.pk: chapter.pages for chapter in chapters}
+            Payment.objects.bulk_pay([
+                Payment(user_id=worker.user_id, amount=worker.get_payment_amount(pages[worker.chapter_id]),
+                        type=PaymentType.IN, worker=worker)
+                for worker in Worker.objects.filter(chapter__in=chapters, user__isnull=False, is_done=True)
+            ])
+
+        for chapter in chapters:
+            chapter.is_published = True
+        return chapters
+
+
+class PaymentQuerySet(ScanlateQuerySet):
+    def balances(self):
+        signed_amount = models.Case(
+            models.When(type=PaymentType.OUT, then=-models.F('amount')),
+            default=models.F('amount')
         )
+        return dict(self.order_by().values('user').annotate(balance=models.Sum(signed_amount))
+                    .values_list('user', 'balance'))
 
-        to_create = [
-            Worker(
-                chapter=chapter,
-                user=worker.user,
-                role=worker.role,
-                rate=worker.rate,
-                is_paid_by_pages=worker.is_paid_by_pages,
-                days_for_work=worker.days_for_work
-            )
-            for worker in title.workers.all()
-        ]
-        Worker.objects.bulk_create(to_create)
-        chapter.start()
-        return chapter
+    def lock(self):
+        # Waits for in-flight payouts to commit and blocks new ones until the end of the transaction
+        with connection.cursor() as cursor:
+            cursor.execute(f'LOCK TABLE {self.model._meta.db_table} IN SHARE MODE')
 
 
-class PaymentManager(models.Manager):
+class PaymentManager(models.Manager.from_queryset(PaymentQuerySet)):
     def create(self, user, amount, payment_type, worker=None):
-        if payment_type == PaymentType.IN:
-            user.balance += amount
-            user.save()
-        elif payment_type == PaymentType.OUT:
-            user.balance -= amount
-            user.save()
-        else:
-            raise ValueError('payment_type must be "in" or "out"')
-
-        return super().create(
-            user=user,
-            amount=amount,
-            datetime=timezone.localtime(),
-            type=payment_type,
-            worker=worker
-        )
+        payment = self.model(user=user, amount=amount, type=payment_type, worker=worker)
+        self.bulk_pay([payment])
+        return payment
+
+    def bulk_pay(self, payments):
+        datetime = timezone.localtime()
+        balances = {}
+        for payment in payments:
+            if payment.type == PaymentType.IN:
+                amount = payment.amount
+            elif payment.type == PaymentType.OUT:
+                amount = -payment.amount
+            else:
+                raise ValueError('payment_type must be "in" or "out"')
+            if payment.datetime is None:
+                payment.datetime = datetime
+            balances[payment.user_id] = balances.get(payment.user_id, 0) + amount
+
+        if not balances:
+            return []
+
+        with transaction.atomic():
+            # Rows are locked in id order so concurrent payouts can't deadlock each other
+            current_balances = dict(User.objects.select_for_update().filter(pk__in=balances.keys())
+                                    .order_by('pk').values_list('pk', 'balance'))
+            User.objects.filter(pk__in=balances.keys()).update(balance=models.Case(
+                *[models.When(pk=user_id, then=models.F('balance') + amount) for user_id, amount in balances.items()]
+            ))
+            payments = self.bulk_create(payments)
+            # Cached authenticated users carry their balance, drop them once the payout is visible
+            transaction.on_commit(lambda: invalidate_users(balances.keys()))
+
+        for payment in payments:
+            if self.model.user.is_cached(payment):
+                payment.user.balance = current_balances[payment.user_id] + balances[payment.user_id]
+        return payments
+
+
+class BalanceSnapshotManager(ScanlateManager):
+    def get_latest_snapshots(self, users=None):
+        snapshots = self.order_by('user', '-payment_id').distinct('user')
+        if users is not None:
+            snapshots = snapshots.filter(user__in=users)
+        return {user_id: (payment_id, balance)
+                for user_id, payment_id, balance in snapshots.values_list('user', 'payment_id', 'balance')}
+
+    def get_unsnapshotted_payments(self, snapshots=None):
+        """Payments newer than the latest snapshot of their user.
+
+        take() snapshots every user with payments up to the same payment id, so a user without a snapshot
+        has no payments before the oldest snapshot and only the id range after it has to be read.
+        """
+        if snapshots is None:
+            snapshots = self.get_latest_snapshots()
+        if not snapshots:
+            return Payment.objects.all()
+
+        users_by_payment_id = defaultdict(list)
+        for user_id, (payment_id, balance) in snapshots.items():
+            users_by_payment_id[payment_id].append(user_id)
+        condition = ~models.Q(user_id__in=snapshots.keys())
+        for payment_id, user_ids in users_by_payment_id.items():
+            condition |= models.Q(user_id__in=user_ids, id__gt=payment_id)
+        return Payment.objects.filter(condition, id__gt=min(users_by_payment_id))
+
+    def get_balances(self, snapshots=None):
+        if snapshots is None:
+            snapshots = self.get_latest_snapshots()
+        balances = {user_id: balance for user_id, (payment_id, balance) in snapshots.items()}
+        for user_id, amount in self.get_unsnapshotted_payments(snapshots).balances().items():
+            balances[user_id] = balances.get(user_id, 0) + amount
+        return balances
+
+    def get_history(self, user):
+        history = [{'datetime': snapshot.datetime, 'balance': snapshot.balance}
+                   for snapshot in self.filter(user=user).order_by('payment_id')]
+        balance = history[-1]['balance'] if history else 0
+        payments = self.get_unsnapshotted_payments(self.get_latest_snapshots([user])).filter(user=user)
+        for payment in payments.order_by('id'):
+            balance += payment.amount if payment.type == PaymentType.IN else -payment.amount
+            history.append({'datetime': payment.datetime, 'balance': balance})
+        return history
+
+    def get_balance(self, user):
+        history = self.get_history(user)
+        return history[-1]['balance'] if history else 0
+
+    def take(self):
+        with transaction.atomic():
+            Payment.objects.lock()
+            snapshots = self.get_latest_snapshots()
+            payments = self.get_unsnapshotted_payments(snapshots)
+            last_payment_id = payments.aggregate(models.Max('id')).get('id__max')
+            if last_payment_id is None:
+                return []
+
+            datetime = timezone.localtime()
+            return self.bulk_create([
+                self.model(user_id=user_id, balance=snapshots.get(user_id, (None, 0))[1] + amount,
+                           payment_id=last_payment_id, datetime=datetime)
+                for user_id, amount in payments.balances().items()
+            ])
+
+    def reconcile(self, full=False):
+        with transaction.atomic():
+            Payment.objects.lock()
+            balances = Payment.objects.balances() if full else self.get_balances()
+            return [
+                (user_id, username, balance, balances.get(user_id, 0))
+                for user_id, username, balance in User.objects.values_list('id', 'username', 'balance')
+                if balance != balances.get(user_id, 0)
+            ]
+
+
+class RefreshTokenManager(ScanlateManager):
+    def hash_key(self, key):
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def issue(self, user):
+        key = secrets.token_urlsafe(32)
+        expires = timezone.now() + timezone.timedelta(seconds=settings.REFRESH_TOKEN_LIFETIME)
+        self.create(user=user, key_hash=self.hash_key(key), expires=expires)
+        return key
+
+    def rotate(self, key):
+        """Revokes a refresh token and returns its user with a new key, or (None, None) if the token is invalid.
+
+        Presenting an already revoked token that has not expired yet revokes every token of its user.
+        """
+        with transaction.atomic():
+            token = self.select_for_update().select_related('user').filter(key_hash=self.hash_key(key)).first()
+            if token is None or token.expires <= timezone.now():
+                return None, None
+            if token.is_revoked:
+                self.revoke_user(token.user)
+                return None, None
+
+            token.is_revoked = True
+            token.save(update_fields=['is_revoked'])
+            self.prune(user=token.user)
+            return token.user, self.issue(token.user)
+
+    def revoke(self, key, user=None):
+        tokens = self.filter(key_hash=self.hash_key(key), is_revoked=False)
+        if user is not None:
+            tokens = tokens.filter(user_id=user.pk)
+        return tokens.update(is_revoked=True)
+
+    def revoke_user(self, user):
+        return self.filter(user_id=user.pk, is_revoked=False).update(is_revoked=True)
+
+    def prune(self, user=None):
+        """Deletes expired tokens, revoked ones are kept until they expire to detect their reuse."""
+        tokens = self.filter(expires__lte=timezone.now())
+        if user is not None:
+            tokens = tokens.filter(user_id=user.pk)
+        deleted, _ = tokens.delete()
+        return deleted
 
 
 class User(AbstractBaseUser):
@@ -135,6 +486,7 @@ class User(AbstractBaseUser):
 
     class Meta:
         ordering = ['username']
+        indexes = [GinIndex(fields=['roles'], name='user_roles_gin_idx')]
 
 
 class Title(models.Model):
@@ -150,15 +502,20 @@ class Title(models.Model):
     img = models.URLField(null=True)
 
     release_frequency = models.IntegerField(choices=ReleaseFrequency.choices)
+    workflow = models.JSONField(null=True, blank=True, default=None)
 
     objects = TitleManager()
 
     class Meta:
         ordering = ['name']
 
+    def get_workflow(self):
+        return get_workflow(self.workflow)
+
 
 class Chapter(models.Model):
-    title = models.ForeignKey(Title, related_name='chapters', on_delete=models.CASCADE)
+    # Indexed by chapter_title_published_idx
+    title = models.ForeignKey(Title, related_name='chapters', on_delete=models.CASCADE, db_index=False)
 
     tome = models.IntegerField()
     chapter = models.FloatField()
@@ -173,56 +530,83 @@ class Chapter(models.Model):
 
     class Meta:
         ordering = ['tome', 'chapter']
+        indexes = [
+            models.Index(fields=['title', 'is_published', 'tome', 'chapter'], name='chapter_title_published_idx'),
+        ]
 
     def set_published_status(self):
-        if not self.is_published and not self.workers.filter(is_done=False).exists():
+        if not self.is_published and Chapter.objects.publish([self]):
             self.is_published = True
-            self.save()
-
-            for worker in self.workers.all():
-                if worker.is_paid_by_pages:
-                    amount = worker.rate * self.pages
-                else:
-                    amount = worker.rate
-                Payment.objects.create(
-                    user=worker.user,
-                    amount=amount,
-                    payment_type=PaymentType.IN,
-                    worker=worker
-                )
 
     def calculate_deadline_for_role(self, role, date):
         worker = self.workers.get(role=role)
         worker.deadline = date + timezone.timedelta(days=worker.days_for_work)
         worker.save()
 
-    def calculate_deadlines(self, current_role):
-        dependencies = RoleExtra.dependencies
-        continuations = RoleExtra.continuations
-        first_role = RoleExtra.first_role
-        last_role = RoleExtra.last_role
-
-        if current_role == last_role:
-            self.end()
-            return
-
-        for role in continuations[current_role]:
-            if not self.workers.filter(role__in=dependencies[role], is_done=False).exists():
-                worker = self.workers.get(role=role)
-
-                if role == first_role:
-                    date = self.start_date - timezone.timedelta(days=1)
-                else:
-                    date = timezone.localdate(self.workers.filter(role__in=dependencies[role])
-                                              .aggregate(models.Max('upload_time')).get('upload_time__max'))
-                worker.deadline = date + timezone.timedelta(days=worker.days_for_work)
-                worker.save()
-
-    def start(self):
-        curator = self.workers.get(role=Role.CURATOR)
-        curator.is_done = True
-        curator.save()
-        self.calculate_deadlines(Role.CURATOR)
+    def get_changed_deadlines(self, workers, roles):
+        workflow = self.title.get_workflow()
+        workers_by_role = {worker.role: worker for worker in workers}
+        done_mask = workflow.mask_of(worker.role for worker in workers if worker.is_done)
+        changed = []
+        for role in roles:
+            worker = workers_by_role.get(role)
+            if worker is None or role not in workflow.dependencies or not workflow.is_ready(role, done_mask):
+                continue
+
+            if role in workflow.first_roles:
+                date = self.start_date - timezone.timedelta(days=1)
+            else:
+                upload_times = [workers_by_role[dependency].upload_time for dependency in workflow.dependencies[role]
+                                if workers_by_role[dependency].upload_time]
+                date = timezone.localdate(max(upload_times)) if upload_times else timezone.localdate()
+
+            deadline = date + timezone.timedelta(days=worker.days_for_work)
+            if worker.deadline != deadline:
+                worker.deadline = deadline
+                changed.append(worker)
+        return changed
+
+    def get_changed_etas(self, workers):
+        workflow = self.title.get_workflow()
+        workers_by_role = {worker.role: worker for worker in workers}
+        today = timezone.localdate()
+        etas = {}
+        changed = []
+        for role in workflow.roles:
+            worker = workers_by_role.get(role)
+            if worker is None:
+                continue
+
+            if worker.is_done:
+                eta = timezone.localdate(worker.upload_time) if worker.upload_time else None
+            elif worker.deadline:
+                eta = max(worker.deadline, today)
+            else:
+                eta = None
+            if eta is None:
+                dependency_etas = [etas[dependency] for dependency in workflow.dependencies[role] if dependency in etas]
+                start = max(dependency_etas) if dependency_etas else self.start_date - timezone.timedelta(days=1)
+                eta = start if worker.is_done else max(start + timezone.timedelta(days=worker.days_for_work), today)
+            etas[role] = eta
+
+            if worker.eta != eta:
+                worker.eta = eta
+                changed.append(worker)
+        return changed
+
+    def calculate_deadlines(self, current_role, workers=None):
+        workflow = self.title.get_workflow()
+        if workers is None:
+            workers = list(self.workers.all())
+
+        changed = set()
+        if current_role in workflow.last_roles:
+            if workflow.is_finished(workflow.mask_of(worker.role for worker in workers if worker.is_done)):
+                self.end()
+        else:
+            changed.update(self.get_changed_deadlines(workers, workflow.continuations[current_role]))
+        changed.update(self.get_changed_etas(workers))
+        Worker.objects.bulk_update(changed, ['deadline', 'eta'])
 
     def end(self):
         self.end_date = timezone.localdate()
@@ -230,7 +614,8 @@ class Chapter(models.Model):
 
 
 class WorkerTemplate(models.Model):
-    title = models.ForeignKey(Title, related_name='workers', on_delete=models.CASCADE)
+    # Indexed by workertemplate_title_user_idx
+    title = models.ForeignKey(Title, related_name='workers', on_delete=models.CASCADE, db_index=False)
     user = models.ForeignKey(User, null=True, default=None, on_delete=models.CASCADE)
     role = models.IntegerField(choices=Role.choices)
 
@@ -239,13 +624,22 @@ class WorkerTemplate(models.Model):
 
     days_for_work = models.IntegerField(default=2)
 
+    objects = ScanlateManager()
+
     class Meta:
         ordering = ['role']
+        indexes = [models.Index(fields=['title', 'user', 'role'], name='workertemplate_title_user_idx')]
+        constraints = [models.UniqueConstraint(fields=['title', 'role'], name='workertemplate_title_role_unique')]
+
+    def make_worker(self, chapter, **kwargs):
+        return Worker(chapter=chapter, user_id=self.user_id, role=self.role, rate=self.rate,
+                      is_paid_by_pages=self.is_paid_by_pages, days_for_work=self.days_for_work, **kwargs)
 
 
 class Worker(models.Model):
-    chapter = models.ForeignKey(Chapter, related_name='workers', on_delete=models.CASCADE)
-    user = models.ForeignKey(User, null=True, on_delete=models.CASCADE)
+    # Indexed by worker_chapter_role_unique and worker_user_done_deadline_idx
+    chapter = models.ForeignKey(Chapter, related_name='workers', on_delete=models.CASCADE, db_index=False)
+    user = models.ForeignKey(User, null=True, on_delete=models.CASCADE, db_index=False)
     role = models.IntegerField(choices=Role.choices)
 
     rate = models.IntegerField(default=100)
@@ -254,12 +648,27 @@ class Worker(models.Model):
     days_for_work = models.IntegerField()
 
     deadline = models.DateField(null=True)
+    eta = models.DateField(null=True)
     upload_time = models.DateTimeField(null=True)
     url = models.URLField(null=True, blank=True)
     is_done = models.BooleanField(default=False)
 
+    objects = ScanlateManager()
+
     class Meta:
         ordering = ['role']
+        indexes = [
+            models.Index(fields=['user', 'is_done', 'deadline'], name='worker_user_done_deadline_idx'),
+            # Most workers are done, the in-progress lists only need the small unfinished part
+            models.Index(fields=['user', 'deadline'], condition=models.Q(is_done=False),
+                         name='worker_user_pending_idx'),
+        ]
+        constraints = [models.UniqueConstraint(fields=['chapter', 'role'], name='worker_chapter_role_unique')]
+
+    def get_payment_amount(self, pages):
+        if self.is_paid_by_pages:
+            return self.rate * pages
+        return self.rate
 
     def upload(self, url):
         self.upload_time = timezone.localtime()
@@ -277,3 +686,32 @@ class Payment(models.Model):
     worker = models.ForeignKey(Worker, null=True, default=None, on_delete=models.SET_NULL)
 
     objects = PaymentManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-datetime', '-id'], include=['amount', 'type', 'worker'],
+                         name='payment_user_datetime_idx'),
+        ]
+
+
+class BalanceSnapshot(models.Model):
+    user = models.ForeignKey(User, related_name='balance_snapshots', on_delete=models.CASCADE)
+    balance = models.IntegerField()
+    payment_id = models.BigIntegerField()
+    datetime = models.DateTimeField()
+
+    objects = BalanceSnapshotManager()
+
+    class Meta:
+        ordering = ['payment_id']
+        indexes = [models.Index(fields=['user', '-payment_id'])]
+
+
+class RefreshToken(models.Model):
+    user = models.ForeignKey(User, related_name='refresh_tokens', on_delete=models.CASCADE)
+    key_hash = models.CharField(max_length=64, unique=True)
+    created = models.DateTimeField(auto_now_add=True)
+    expires = models.DateTimeField()
+    is_revoked = models.BooleanField(default=False)
+
+    objects = RefreshTokenManager()
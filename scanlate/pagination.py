@@ -1,9 +1,17 @@
+import base64
+import datetime
+import json
 import math
 from collections import OrderedDict
 
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core import exceptions as django_exceptions
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
 from rest_framework.pagination import BasePagination, _positive_int
 from rest_framework.response import Response
 
+from .counting import get_counter
 from .response import ScanlateResponse
 
 
@@ -12,20 +20,29 @@ class CountPagePagination(BasePagination):
     max_count = 40
     default_count = 20
     page_query_param = 'page'
+    cursor_query_param = 'cursor'
+    cursor_paginator = None
 
     def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param and self.cursor_query_param in request.query_params:
+            self.cursor_paginator = KeysetPagination()
+            return self.cursor_paginator.paginate_queryset(queryset, request, view)
+
         self.count = self.get_count(request)
         self.total_items = self.get_total_items(queryset)
         self.total_pages = math.ceil(self.total_items / self.count)
         self.page = self.get_page(request)
         self.request = request
-        if self.total_items == 0 or self.page > self.total_pages:
+        if self.total_items_exact and (self.total_items == 0 or self.page > self.total_pages):
             return []
         return list(queryset[(self.page - 1) * self.count:self.page * self.count])
 
     def get_paginated_response(self, data):
+        if self.cursor_paginator:
+            return self.cursor_paginator.get_paginated_response(data)
         return ScanlateResponse(content=data, props=OrderedDict([
             ('total_items', self.total_items),
+            ('total_items_exact', self.total_items_exact),
             ('total_pages', self.total_pages),
             ('page', self.page),
         ]))
@@ -49,6 +66,10 @@ class CountPagePagination(BasePagination):
                             'type': 'integer',
                             'example': 123,
                         },
+                        'total_items_exact': {
+                            'type': 'boolean',
+                            'example': True,
+                        },
                         'total_pages': {
                             'type': 'integer',
                             'example': 123,
@@ -86,6 +107,128 @@ class CountPagePagination(BasePagination):
 
     def get_total_items(self, queryset):
         try:
-            return queryset.count()
+            self.total_items, self.total_items_exact = get_counter().count(queryset)
         except (AttributeError, TypeError):
-            return len(queryset)
+            self.total_items, self.total_items_exact = len(queryset), True
+        return self.total_items
+
+
+class CursorJSONEncoder(DjangoJSONEncoder):
+    # DjangoJSONEncoder cuts datetimes to milliseconds, cursors need the exact value to compare ties
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+class KeysetPagination(CountPagePagination):
+    total_query_param = 'total'
+    ordering = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = self.get_count(request)
+        self.ordering = self.get_ordering(queryset)
+        self.request = request
+        self.total_items = self.get_total_items(queryset) if self.with_total(request) else None
+
+        queryset = queryset.order_by(*self.ordering)
+        cursor = self.decode_cursor(request, queryset)
+        if cursor is not None:
+            queryset = queryset.filter(self.get_keyset_filter(cursor))
+
+        items = list(queryset[:self.count + 1])
+        self.has_next = len(items) > self.count
+        items = items[:self.count]
+        self.next_cursor = self.encode_cursor(items[-1]) if self.has_next else None
+        return items
+
+    def get_paginated_response(self, data):
+        props = OrderedDict([
+            ('next_cursor', self.next_cursor),
+        ])
+        if self.total_items is not None:
+            props['total_items'] = self.total_items
+            props['total_items_exact'] = self.total_items_exact
+        return ScanlateResponse(content=data, props=props)
+
+    def get_paginated_response_schema(self, schema):
+        schema = super().get_paginated_response_schema(schema)
+        schema['properties']['props']['properties'] = {
+            'next_cursor': {
+                'type': 'string',
+                'nullable': True,
+            },
+            'total_items': {
+                'type': 'integer',
+                'example': 123,
+            },
+        }
+        return schema
+
+    def with_total(self, request):
+        value = request.query_params.get(self.total_query_param)
+        return value is not None and value.isdigit() and bool(int(value))
+
+    def get_ordering(self, queryset):
+        if self.ordering:
+            return self.ordering
+
+        # Any ordering becomes a total order once the primary key is used as the last tie-breaker
+        ordering = [field for field in queryset.query.order_by or queryset.model._meta.ordering
+                    if isinstance(field, str)]
+        if not any(field.lstrip('-') in ('id', 'pk') for field in ordering):
+            ordering.append('-id' if ordering and ordering[0].startswith('-') else 'id')
+        return tuple(field.replace('pk', 'id') if field.lstrip('-') == 'pk' else field for field in ordering)
+
+    def get_fields(self):
+        return [field.lstrip('-') for field in self.ordering]
+
+    def encode_cursor(self, item):
+        values = [getattr(item, field) for field in self.get_fields()]
+        return base64.urlsafe_b64encode(json.dumps(values, cls=CursorJSONEncoder).encode()).decode()
+
+    def get_output_field(self, queryset, field):
+        annotation = queryset.query.annotations.get(field)
+        if annotation is not None:
+            return annotation.output_field
+        return queryset.model._meta.get_field(field)
+
+    def decode_cursor(self, request, queryset):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            fields = self.get_fields()
+            if not isinstance(values, list) or len(values) != len(fields):
+                raise ValueError
+            return [self.get_output_field(queryset, field).to_python(value) for field, value in zip(fields, values)]
+        except (ValueError, TypeError, django_exceptions.ValidationError, django_exceptions.FieldDoesNotExist):
+            raise ValidationError({self.cursor_query_param: 'Неверный курсор.'})
+
+    def get_after_filter(self, field, value):
+        # PostgreSQL puts NULLs last in ascending order and first in descending order
+        name = field.lstrip('-')
+        if field.startswith('-'):
+            return Q(**{f'{name}__isnull': False}) if value is None else Q(**{f'{name}__lt': value})
+        if value is None:
+            return Q(pk__in=[])
+        return Q(**{f'{name}__gt': value}) | Q(**{f'{name}__isnull': True})
+
+    def get_equal_filter(self, field, value):
+        name = field.lstrip('-')
+        return Q(**{f'{name}__isnull': True}) if value is None else Q(**{name: value})
+
+    def get_keyset_filter(self, values):
+        keyset_filter = Q()
+        for index in reversed(range(len(self.ordering))):
+            field = self.ordering[index]
+            condition = self.get_after_filter(field, values[index])
+            if index < len(self.ordering) - 1:
+                condition |= self.get_equal_filter(field, values[index]) & keyset_filter
+            keyset_filter = condition
+        return keyset_filter
+
+
+class PaymentPagination(KeysetPagination):
+    ordering = ('-datetime', '-id')
@@ -1,26 +1,22 @@
-import requests
-import json
-from django.conf import settings
-from .models import Title
-
-REMANGA_TOKEN = settings.REMANGA_TOKEN
-REMANGA_TEAM_ID = settings.REMANGA_TEAM_ID
+import logging
 
-session = requests.Session()
-session.headers.update({'Authorization': f'Bearer {REMANGA_TOKEN}'})
+import httpx
+from django.conf import settings
+from .models import Title, Chapter
+from .remanga import RemangaClient, chapter_key
 
+logger = logging.getLogger(__name__)
 
-def get_content(url):
-    response = session.get(url)
-    if response.status_code != 200:
-        return None
-    content = json.loads(response.text).get('content')
-    return content
+SYNC_MAX_WORKERS = settings.REMANGA_MAX_CONNECTIONS
 
 
 def create_title(title_slug, **kwargs):
-    url = f'https://api.remanga.org/api/titles/{title_slug}/'
-    content = get_content(url)
+    # Called inside a request, so Remanga gets only a part of the worker timeout
+    try:
+        content = RemangaClient(deadline=settings.REMANGA_INTERACTIVE_DEADLINE).get_title(title_slug)
+    except (httpx.HTTPError, TimeoutError):
+        logger.warning('Failed to fetch title "%s"', title_slug, exc_info=True)
+        return None
     if content is None:
         return content
     img = 'https://remanga.org' + content.get('img').get('high')
@@ -28,18 +24,35 @@ def create_title(title_slug, **kwargs):
     return Title.objects.create(name=name, slug=title_slug, img=img, **kwargs)
 
 
-def check_chapters(title_slug):
-    title_url = f'https://api.remanga.org/api/titles/{title_slug}/'
-    title_content = get_content(title_url)
-    branch_id = title_content.get('active_branch')
+def get_published_chapters(title_slug):
+    return RemangaClient().get_published_chapters(title_slug)
+
 
-    chapters_url = f'https://api.remanga.org/api/titles/?branch_id={branch_id}?is_published=1'
-    chapters_content = get_content(chapters_url)
-    published_chapters = []
-    for chapter in chapters_content:
-        published_chapters.append([chapter.get('tome'), chapter.get('chapter')])
+def publish_chapters(titles, published_chapters):
+    to_publish = []
+    chapters = Chapter.objects.filter(title__in=titles, is_published=False).only('id', 'title_id', 'tome', 'chapter')
+    for chapter in chapters:
+        published = published_chapters.get(chapter.title_id)
+        if published and chapter_key(chapter.tome, chapter.chapter) in published:
+            to_publish.append(chapter)
+    return Chapter.objects.publish(to_publish)
 
+
+def check_chapters(title_slug):
     title = Title.objects.get(slug=title_slug)
-    for chapter in title.chapters.filter(is_published=False):
-        if [chapter.tome, chapter.chapter] in published_chapters:
-            chapter.set_published_status()
+    published_chapters = get_published_chapters(title_slug)
+    if published_chapters is None:
+        return []
+    return publish_chapters([title], {title.id: published_chapters})
+
+
+def sync_published(titles=None, max_workers=SYNC_MAX_WORKERS):
+    if titles is None:
+        titles = Title.objects.filter(is_active=True)
+    titles = list(titles)
+
+    client = RemangaClient(max_connections=max_workers)
+    results = client.get_many_published_chapters([title.slug for title in titles])
+    published_chapters = {title.id: results[title.slug] for title in titles if results[title.slug] is not None}
+
+    return publish_chapters(titles, published_chapters)
@@ -16,7 +16,7 @@ class IsAdmin(permissions.BasePermission):
 
 class IsUser(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
-        return obj == request.user
+        return obj.pk == request.user.pk
 
 
 class IsCurator(permissions.BasePermission):
@@ -26,4 +26,4 @@ class IsCurator(permissions.BasePermission):
 
 class IsWorker(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
-        return obj.user == request.user
+        return obj.user_id == request.user.pk
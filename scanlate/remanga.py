@@ -0,0 +1,201 @@
+import asyncio
+import hashlib
+import logging
+import time
+
+import httpx
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def chapter_key(tome, chapter):
+    try:
+        return int(tome), float(chapter)
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.next_time = 0
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        loop = asyncio.get_running_loop()
+        async with self.lock:
+            now = loop.time()
+            delay = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class AsyncRemangaClient:
+    def __init__(self, base_url=None, token=None, timeout=None, max_connections=None,
+                 rate_limit=None, retries=None, backoff=None, max_retry_delay=None, deadline=None,
+                 cache_alias=None, cache_ttl=None):
+        self.base_url = base_url or settings.REMANGA_API_URL
+        self.retries = settings.REMANGA_RETRIES if retries is None else retries
+        self.backoff = settings.REMANGA_BACKOFF if backoff is None else backoff
+        self.max_retry_delay = settings.REMANGA_MAX_RETRY_DELAY if max_retry_delay is None else max_retry_delay
+        # Total seconds for all requests of the client, retries are not started past it
+        self.deadline = deadline
+        self.deadline_at = None
+        self.max_connections = max_connections or settings.REMANGA_MAX_CONNECTIONS
+        self.rate_limit = settings.REMANGA_RATE_LIMIT if rate_limit is None else rate_limit
+        self.cache = caches[cache_alias or settings.REMANGA_CACHE]
+        self.cache_ttl = settings.REMANGA_CACHE_TTL if cache_ttl is None else cache_ttl
+        token = token or settings.REMANGA_TOKEN
+
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers={'Authorization': f'Bearer {token}'},
+            timeout=settings.REMANGA_TIMEOUT if timeout is None else timeout,
+            limits=httpx.Limits(max_connections=self.max_connections,
+                                max_keepalive_connections=self.max_connections),
+        )
+        self.semaphores = {}
+        self.limiters = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.aclose()
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    def get_host_guards(self, host):
+        if host not in self.semaphores:
+            self.semaphores[host] = asyncio.Semaphore(self.max_connections)
+            self.limiters[host] = RateLimiter(self.rate_limit)
+        return self.semaphores[host], self.limiters[host]
+
+    def get_retry_delay(self, attempt, response=None):
+        delay = self.backoff * 2 ** attempt
+        if response is not None:
+            retry_after = response.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                delay = int(retry_after)
+        return min(delay, self.max_retry_delay)
+
+    def is_past_deadline(self, delay):
+        return self.deadline_at is not None and asyncio.get_running_loop().time() + delay > self.deadline_at
+
+    async def request(self, request):
+        semaphore, limiter = self.get_host_guards(request.url.host)
+        if self.deadline is not None and self.deadline_at is None:
+            self.deadline_at = asyncio.get_running_loop().time() + self.deadline
+
+        for attempt in range(self.retries + 1):
+            is_last = attempt == self.retries
+            response = None
+            async with semaphore:
+                await limiter.wait()
+                try:
+                    response = await self.client.send(request)
+                except httpx.TransportError:
+                    if is_last:
+                        raise
+                    delay = self.get_retry_delay(attempt)
+                    if self.is_past_deadline(delay):
+                        raise
+                    logger.warning('Request to %s failed, retrying', request.url, exc_info=True)
+            if response is not None:
+                if response.status_code not in RETRY_STATUS_CODES or is_last:
+                    return response
+                delay = self.get_retry_delay(attempt, response)
+                if self.is_past_deadline(delay):
+                    logger.warning('Request to %s failed, no time left to retry', request.url)
+                    return response
+            await asyncio.sleep(delay)
+
+    def get_cache_key(self, url):
+        return 'remanga:' + hashlib.md5(str(url).encode()).hexdigest()
+
+    async def get_content(self, url, **kwargs):
+        request = self.client.build_request('GET', url, **kwargs)
+        cache_key = self.get_cache_key(request.url)
+        cached = await self.cache.aget(cache_key)
+        if cached is not None:
+            if cached['expires'] > time.time():
+                return cached['content']
+            if cached['etag']:
+                request.headers['If-None-Match'] = cached['etag']
+            if cached['last_modified']:
+                request.headers['If-Modified-Since'] = cached['last_modified']
+
+        response = await self.request(request)
+        if response.status_code == 304 and cached is not None:
+            content = cached['content']
+        elif response.status_code == 200:
+            content = response.json().get('content')
+        else:
+            return None
+
+        await self.cache.aset(cache_key, {
+            'content': content,
+            'etag': response.headers.get('ETag', cached and cached['etag']),
+            'last_modified': response.headers.get('Last-Modified', cached and cached['last_modified']),
+            'expires': time.time() + self.cache_ttl,
+        })
+        return content
+
+    async def get_title(self, title_slug):
+        return await self.get_content(f'titles/{title_slug}/')
+
+    async def get_published_chapters(self, title_slug):
+        title_content = await self.get_title(title_slug)
+        if title_content is None:
+            return None
+        branch_id = title_content.get('active_branch')
+
+        chapters_content = await self.get_content('titles/', params={'branch_id': branch_id, 'is_published': 1})
+        if chapters_content is None:
+            return None
+        return {chapter_key(chapter.get('tome'), chapter.get('chapter')) for chapter in chapters_content}
+
+    async def safe_get_published_chapters(self, title_slug):
+        try:
+            return await self.get_published_chapters(title_slug)
+        except (httpx.HTTPError, ValueError):
+            logger.exception('Failed to fetch published chapters of "%s"', title_slug)
+            return None
+
+    async def get_many_published_chapters(self, title_slugs):
+        results = await asyncio.gather(*[self.safe_get_published_chapters(slug) for slug in title_slugs])
+        return dict(zip(title_slugs, results))
+
+
+class RemangaClient:
+    """Sync facade over AsyncRemangaClient, every call uses its own connection pool.
+
+    With a deadline every call raises TimeoutError once it runs longer than that many seconds.
+    """
+
+    def __init__(self, deadline=None, **kwargs):
+        self.deadline = deadline
+        self.kwargs = kwargs
+
+    async def call(self, method, *args):
+        async with asyncio.timeout(self.deadline):
+            async with AsyncRemangaClient(deadline=self.deadline, **self.kwargs) as client:
+                return await getattr(client, method)(*args)
+
+    def get_title(self, title_slug):
+        return async_to_sync(self.call)('get_title', title_slug)
+
+    def get_published_chapters(self, title_slug):
+        return async_to_sync(self.call)('get_published_chapters', title_slug)
+
+    def get_many_published_chapters(self, title_slugs):
+        return async_to_sync(self.call)('get_many_published_chapters', title_slugs)
@@ -1,7 +1,8 @@
+from django.db import models, transaction
 from rest_framework import serializers
 from rest_framework.authtoken.models import Token
 
-from . import parser
+from . import cache, parser, tokens
 from .models import *
 
 
@@ -36,11 +37,13 @@ class UserRegisterSerializer(serializers.ModelSerializer):
         extra_kwargs = {'roles': {'required': True}}
 
     def create(self, validated_data):
-        return User.objects.create(
+        user = User.objects.create(
             username=validated_data.get('username').lower(),
             password=validated_data.get('password'),
             roles=validated_data.get('roles')
         )
+        cache.invalidate_roles()
+        return user
 
 
 class UserRegisterResponseSerializer(serializers.Serializer):
@@ -56,15 +59,41 @@ class UserLoginSerializer(serializers.Serializer):
 
 class UserLoginResponseSerializer(UserCurrentSerializer):
     token = serializers.SerializerMethodField()
+    access_token = serializers.SerializerMethodField()
+    refresh_token = serializers.SerializerMethodField()
+    expires_in = serializers.SerializerMethodField()
 
     class Meta:
         model = User
-        fields = ['id', 'is_admin', 'is_curator', 'token', 'balance']
+        fields = ['id', 'is_admin', 'is_curator', 'token', 'access_token', 'refresh_token', 'expires_in', 'balance']
+
+    def get_tokens(self, obj):
+        if not hasattr(self, '_tokens'):
+            self._tokens = tokens.issue_tokens(obj)
+        return self._tokens
 
     def get_token(self, obj):
         token, created = Token.objects.get_or_create(user=obj)
         return token.key
 
+    def get_access_token(self, obj):
+        return self.get_tokens(obj)['access_token']
+
+    def get_refresh_token(self, obj):
+        return self.get_tokens(obj)['refresh_token']
+
+    def get_expires_in(self, obj):
+        return self.get_tokens(obj)['expires_in']
+
+
+class TokenRefreshSerializer(serializers.Serializer):
+    refresh_token = serializers.CharField(required=True)
+
+
+class TokenRevokeSerializer(serializers.Serializer):
+    refresh_token = serializers.CharField(required=False)
+    all = serializers.BooleanField(required=False, default=False)
+
 
 # User
 class UserSerializer(serializers.ModelSerializer):
@@ -88,13 +117,18 @@ class UserRetrieveSerializer(serializers.ModelSerializer):
         fields = ['id', 'roles', 'username', 'status', 'discord_id', 'vk_id', 'telegram']
 
     def get_roles(self, obj):
+        titles_by_role = {role: [] for role in obj.roles}
+        titles = Title.objects.filter(workers__user=obj, workers__role__in=obj.roles) \
+            .annotate(role=models.F('workers__role')).order_by('name', 'id').distinct()
+        for title in titles:
+            titles_by_role[title.role].append(title)
+
         roles = []
         for role in obj.roles:
-            titles = Title.objects.filter(workers__user=obj, workers__role=role).order_by('name')
             data = {
                 'role': role,
-                'titles': TitleListSerializer(titles, many=True).data,
-                'titles_count': titles.count()
+                'titles': TitleListSerializer(titles_by_role[role], many=True).data,
+                'titles_count': len(titles_by_role[role])
             }
             roles.append(data)
         return roles
@@ -128,6 +162,13 @@ class UserUpdateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError('Куратор не может менять роли у куратора.')
         return roles
 
+    def update(self, instance, validated_data):
+        user = super().update(instance, validated_data)
+        if 'roles' in validated_data:
+            cache.invalidate_roles()
+        cache.invalidate_users([user.pk])
+        return user
+
 
 class UserStatusSerializer(serializers.ModelSerializer):
     class Meta:
@@ -135,6 +176,13 @@ class UserStatusSerializer(serializers.ModelSerializer):
         fields = ['status']
         extra_kwargs = {'status': {'required': True}}
 
+    def update(self, instance, validated_data):
+        # The instance is request.user which may be a cached copy, only the status is written back
+        instance.status = validated_data['status']
+        instance.save(update_fields=['status'])
+        cache.invalidate_users([instance.pk])
+        return instance
+
 
 # Worker Template
 class WorkerTemplateNestedSerializer(serializers.ModelSerializer):
@@ -161,6 +209,19 @@ class WorkerNestedSerializer(serializers.ModelSerializer):
         exclude = ['chapter']
 
 
+def get_worker_template(title, worker_data):
+    return WorkerTemplate(title=title,
+                          role=worker_data.get('role'),
+                          rate=worker_data.get('rate'),
+                          is_paid_by_pages=worker_data.get('is_paid_by_pages'),
+                          user=worker_data.get('user'),
+                          days_for_work=worker_data.get('days_for_work'))
+
+
+def get_workers_by_role(workers_data):
+    return {worker_data.get('role'): worker_data for worker_data in workers_data}
+
+
 class WorkerValidationMixin:
     def validate(self, data):
         user = data.get('user')
@@ -172,18 +233,36 @@ class WorkerValidationMixin:
 
 
 class WorkerRolesValidationMixin:
-    def validate_workers(self, workers):
-        if len(workers) != len(Role.values):
-            raise serializers.ValidationError('Здесь меньше или больше необходимых ролей.')
-        for role in Role.values:
-            role_is_there = False
-            for worker in workers:
-                if worker.get('role') == role:
-                    role_is_there = True
-                    break
-            if not role_is_there:
-                raise serializers.ValidationError(f'Нет роли {role}.')
-        return workers
+    def get_workflow(self, data):
+        if 'workflow' in data:
+            return get_workflow(data.get('workflow'))
+        return self.instance.get_workflow() if self.instance else get_workflow()
+
+    def validate(self, data):
+        data = super().validate(data)
+        workflow = self.get_workflow(data)
+        workers = data.get('workers', [])
+        roles_mask = workflow.mask_of(worker.get('role') for worker in workers)
+
+        if len(workers) != len(workflow.roles) or roles_mask & ~workflow.mask:
+            raise serializers.ValidationError({'workers': 'Здесь меньше или больше необходимых ролей.'})
+        for role in workflow.roles:
+            if not roles_mask & 1 << role:
+                raise serializers.ValidationError({'workers': f'Нет роли {role}.'})
+        return data
+
+
+class WorkflowValidationMixin:
+    def validate_workflow(self, workflow):
+        if workflow is None:
+            return workflow
+        try:
+            get_workflow(workflow)
+        except ValueError as e:
+            raise serializers.ValidationError(str(e))
+        except (TypeError, AttributeError):
+            raise serializers.ValidationError('Неверный формат процесса.')
+        return workflow
 
 
 # Title Serializers
@@ -199,13 +278,13 @@ class TitleRetrieveSerializer(serializers.ModelSerializer):
     class Meta:
         model = Title
         fields = ['id', 'name', 'raw_name', 'slug', 'is_active', 'raw',
-                  'discord_channel', 'img', 'release_frequency', 'workers']
+                  'discord_channel', 'img', 'release_frequency', 'workflow', 'workers']
 
     def get_workers(self, title):
         workers = []
         user = self.context.get('user')
-        user_workers = title.workers.filter(user=user)
-        other_workers = title.workers.exclude(user=user)
+        user_workers = title.workers.filter(user_id=user.pk)
+        other_workers = title.workers.exclude(user_id=user.pk)
 
         workers.extend(WorkerTemplateNestedSerializer(instance=other_workers, many=True).data)
         workers.extend(WorkerTemplateDetailNestedSerializer(instance=user_workers, many=True).data)
@@ -233,12 +312,13 @@ class TitleWorkerTemplateUpdateSerializer(serializers.ModelSerializer, WorkerVal
         }
 
 
-class TitleCreateSerializer(serializers.ModelSerializer, WorkerRolesValidationMixin):
+class TitleCreateSerializer(WorkerRolesValidationMixin, WorkflowValidationMixin, serializers.ModelSerializer):
     workers = TitleWorkerTemplateUpdateSerializer(many=True)
 
     class Meta:
         model = Title
-        fields = ['slug', 'raw_name', 'is_active', 'discord_channel', 'raw', 'ad_date', 'workers', 'release_frequency']
+        fields = ['slug', 'raw_name', 'is_active', 'discord_channel', 'raw', 'ad_date', 'workers', 'release_frequency',
+                  'workflow']
 
     def create(self, validated_data):
         title_slug = validated_data.pop('slug')
@@ -247,42 +327,47 @@ class TitleCreateSerializer(serializers.ModelSerializer, WorkerRolesValidationMi
         if title is None:
             raise serializers.ValidationError({'detail': 'Не удалось создать тайтл.'})
 
-        to_create = [
-            WorkerTemplate(title=title,
-                           role=worker_data.get('role'),
-                           rate=worker_data.get('rate'),
-                           is_paid_by_pages=worker_data.get('is_paid_by_pages'),
-                           user=worker_data.get('user'),
-                           days_for_work=worker_data.get('days_for_work'))
-            for worker_data in workers_data
-        ]
-        WorkerTemplate.objects.bulk_create(to_create)
+        WorkerTemplate.objects.bulk_create([get_worker_template(title, worker_data) for worker_data in workers_data])
         return title
 
 
-class TitleUpdateSerializer(serializers.ModelSerializer, WorkerRolesValidationMixin):
+class TitleUpdateSerializer(WorkerRolesValidationMixin, WorkflowValidationMixin, serializers.ModelSerializer):
     workers = TitleWorkerTemplateUpdateSerializer(many=True)
 
     class Meta:
         model = Title
-        fields = ['raw_name', 'is_active', 'discord_channel', 'raw', 'ad_date', 'workers', 'release_frequency']
+        fields = ['raw_name', 'is_active', 'discord_channel', 'raw', 'ad_date', 'workers', 'release_frequency',
+                  'workflow']
 
     def update(self, instance, validated_data):
-        workers_data = validated_data.pop('workers')
-        workers = instance.workers.all()
-        for worker in workers:
-            worker_data = {}
-            for el in workers_data:
-                if el.get('role') == worker.role:
-                    worker_data = el
-                    break
-            worker.rate = worker_data.get('rate')
-            worker.is_paid_by_pages = worker_data.get('is_paid_by_pages')
-            worker.user = worker_data.get('user')
-            worker.days_for_work = worker_data.get('days_for_work')
-        WorkerTemplate.objects.bulk_update(workers, ['rate', 'is_paid_by_pages', 'user', 'days_for_work'])
-
-        return super().update(instance, validated_data)
+        # Validation guarantees one entry per role of the (possibly new) workflow
+        workers_data = get_workers_by_role(validated_data.pop('workers'))
+        with transaction.atomic():
+            workers = []
+            removed = []
+            days_for_work = {}
+            for worker in instance.workers.all():
+                worker_data = workers_data.pop(worker.role, None)
+                if worker_data is None:
+                    removed.append(worker.pk)
+                    continue
+                if worker.days_for_work != worker_data.get('days_for_work'):
+                    days_for_work[worker.role] = worker_data.get('days_for_work')
+                worker.rate = worker_data.get('rate')
+                worker.is_paid_by_pages = worker_data.get('is_paid_by_pages')
+                worker.user = worker_data.get('user')
+                worker.days_for_work = worker_data.get('days_for_work')
+                workers.append(worker)
+
+            if removed:
+                WorkerTemplate.objects.filter(pk__in=removed).delete()
+            WorkerTemplate.objects.bulk_update(workers, ['rate', 'is_paid_by_pages', 'user', 'days_for_work'])
+            WorkerTemplate.objects.bulk_create([get_worker_template(instance, worker_data)
+                                                for worker_data in workers_data.values()])
+            instance = super().update(instance, validated_data)
+            if removed or workers_data or days_for_work:
+                Chapter.objects.apply_workflow(instance, days_for_work)
+            return instance
 
 
 class TitleUpdateResponseSerializer(serializers.ModelSerializer):
@@ -334,22 +419,37 @@ class ChapterCreateSerializer(serializers.ModelSerializer):
         extra_kwargs = {'start_date': {'required': False}}
 
 
-class ChapterUpdateSerializer(serializers.ModelSerializer, WorkerRolesValidationMixin):
+class ChapterBulkItemSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Chapter
+        fields = ['tome', 'chapter', 'pages', 'start_date']
+        extra_kwargs = {'start_date': {'required': False}}
+
+
+class ChapterBulkCreateSerializer(serializers.Serializer):
+    title = serializers.PrimaryKeyRelatedField(queryset=Title.objects.all())
+    chapters = ChapterBulkItemSerializer(many=True, allow_empty=False)
+
+    def create(self, validated_data):
+        return Chapter.objects.create_many(validated_data.get('title'), validated_data.get('chapters'))
+
+
+class ChapterUpdateSerializer(WorkerRolesValidationMixin, serializers.ModelSerializer):
     workers = ChapterWorkerSerializer(many=True)
 
     class Meta:
         model = Chapter
         fields = ['tome', 'chapter', 'pages', 'workers']
 
+    def get_workflow(self, data):
+        return self.instance.title.get_workflow()
+
     def update(self, instance, validated_data):
-        workers_data = validated_data.pop('workers')
-        workers = instance.workers.all()
+        workers_data = get_workers_by_role(validated_data.pop('workers'))
+        # Done workers of roles dropped from the workflow are left as they are
+        workers = [worker for worker in instance.workers.all() if worker.role in workers_data]
         for worker in workers:
-            worker_data = {}
-            for el in workers_data:
-                if el.get('role') == worker.role:
-                    worker_data = el
-                    break
+            worker_data = workers_data[worker.role]
             worker.rate = worker_data.get('rate')
             worker.is_paid_by_pages = worker_data.get('is_paid_by_pages')
             worker.user = worker_data.get('user')
@@ -360,6 +460,7 @@ class ChapterUpdateSerializer(serializers.ModelSerializer, WorkerRolesValidation
         instance.chapter = validated_data.get('chapter')
         instance.pages = validated_data.get('pages')
         instance.save()
+        Chapter.objects.calculate_deadlines([instance])
         return instance
 
 
@@ -398,10 +499,34 @@ class UserChaptersSerializer(serializers.ModelSerializer):
         fields = ['id', 'role', 'deadline', 'is_done', 'urls', 'chapter', 'title']
 
     def get_urls(self, obj):
-        if obj.role == RoleExtra.first_role:
-            return []
-        return WorkerUrlSerializer(obj.chapter.workers.filter(role__in=RoleExtra.dependencies[obj.role]),
-                                   many=True).data
+        workflow = obj.chapter.title.get_workflow()
+        dependencies = workflow.predecessors.get(obj.role, 0) & ~(1 << Role.CURATOR)
+        workers = [worker for worker in obj.chapter.workers.all() if dependencies & 1 << worker.role]
+        return WorkerUrlSerializer(workers, many=True).data
 
     def get_title(self, obj):
         return TitleNestedSerializer(obj.chapter.title).data
+
+
+# Release Calendar
+class ReleaseCalendarSerializer(serializers.ModelSerializer):
+    chapter = ScanlateFloatField()
+    title = TitleNestedSerializer()
+    release_date = serializers.DateField()
+
+    class Meta:
+        model = Chapter
+        fields = ['id', 'tome', 'chapter', 'title', 'start_date', 'release_date']
+
+
+# Payment
+class PaymentSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Payment
+        fields = ['id', 'amount', 'datetime', 'type', 'worker']
+
+
+class PaymentPeriodSerializer(serializers.Serializer):
+    period = serializers.DateField()
+    income = serializers.IntegerField()
+    outcome = serializers.IntegerField()
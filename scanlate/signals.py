@@ -0,0 +1,14 @@
+from django.apps import apps
+from django.db.models.signals import post_save, post_delete
+
+from .cache import bump_model_version
+
+
+def bump_version_on_write(sender, **kwargs):
+    bump_model_version(sender)
+
+
+# Connected per model, a receiver without a sender would disable fast deletes of every model in the project
+for model in apps.get_app_config('scanlate').get_models():
+    post_save.connect(bump_version_on_write, sender=model)
+    post_delete.connect(bump_version_on_write, sender=model)
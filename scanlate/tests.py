@@ -1,8 +1,33 @@
-from django.test import TestCase
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, TransactionTestCase
 from django.utils import timezone
+from django.core.cache import cache
+from django.core.management import call_command
+from io import StringIO
+from django.test import override_settings
+from rest_framework.test import APIClient
 from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+import json
+import time
+import tempfile
 
+from . import parser
 from .models import *
+from django.contrib.auth.hashers import make_password
+from rest_framework.authtoken.models import Token
+from .authentication import ScanlateTokenAuthentication
+from .checks import check_connection_budget
+from .counting import CachedCounter, EstimatedCounter
+from .remanga import RemangaClient
+from .serializers import TitleUpdateSerializer
+
+
+# Caches that are invalidated through model and user versions are only used with a shared default cache
+shared_cache = override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': tempfile.mkdtemp()},
+})
 
 
 class TitleManagerTestCase(TestCase):
@@ -125,3 +150,1213 @@ class ChapterTestCase(TestCase):
             else:
                 balance = worker.rate
             self.assertEquals(worker.user.balance, balance)
+
+
+def create_title_with_workers(slug='title', **kwargs):
+    title = Title.objects.create(name=slug.capitalize(), slug=slug, img=None,
+                                 release_frequency=ReleaseFrequency.WEEKLY, **kwargs)
+    for index, role in enumerate(title.get_workflow().roles):
+        user, created = User.objects.get_or_create(username=f'user{role}', defaults={'roles': [role]})
+        WorkerTemplate.objects.create(title=title, user=user, role=role, rate=index * 12,
+                                      is_paid_by_pages=index % 2 == 0)
+    return title
+
+
+def finish_workers(chapter):
+    chapter.workers.update(is_done=True, upload_time=timezone.localtime())
+
+
+class PublishTestCase(TestCase):
+    def setUp(self):
+        self.title = create_title_with_workers()
+        self.chapters = [Chapter.objects.create(title=self.title, tome=1, chapter=number, pages=10)
+                         for number in (1, 2, 3.5)]
+
+    def test_publish_skips_unfinished_chapters(self):
+        finish_workers(self.chapters[0])
+
+        published = Chapter.objects.publish(self.chapters)
+
+        self.assertEquals([chapter.pk for chapter in published], [self.chapters[0].pk])
+        self.assertEquals(Payment.objects.count(), len(Role.values))
+        for worker in self.chapters[0].workers.select_related('user'):
+            amount = worker.rate * 10 if worker.is_paid_by_pages else worker.rate
+            self.assertEquals(worker.user.balance, amount)
+
+    def test_set_published_status(self):
+        chapter = self.chapters[0]
+        finish_workers(chapter)
+
+        with self.assertNumQueries(11):
+            chapter.set_published_status()
+
+        self.assertTrue(chapter.is_published)
+        self.assertTrue(Chapter.objects.get(pk=chapter.pk).is_published)
+        self.assertEquals(Payment.objects.filter(worker__chapter=chapter).count(), len(Role.values))
+
+    def test_publish_many(self):
+        for chapter in self.chapters:
+            finish_workers(chapter)
+
+        published = Chapter.objects.publish(self.chapters)
+
+        self.assertEquals(len(published), 3)
+        for user in User.objects.all():
+            worker = user.worker_set.first()
+            self.assertEquals(user.balance, worker.get_payment_amount(10) * 3)
+
+    def test_publish_is_idempotent(self):
+        finish_workers(self.chapters[0])
+
+        Chapter.objects.publish(self.chapters)
+        published = Chapter.objects.publish(self.chapters)
+
+        self.assertEquals(published, [])
+        self.assertEquals(Payment.objects.count(), len(Role.values))
+
+    def test_sync_published(self):
+        for chapter in self.chapters:
+            finish_workers(chapter)
+        remanga_chapters = [{'tome': 1, 'chapter': '1'}, {'tome': 1, 'chapter': '3.5'}]
+
+        with RemangaStubServer({'/titles/title/': {'active_branch': 7},
+                                '/titles/?branch_id=7&is_published=1': remanga_chapters}) as server:
+            with override_settings(REMANGA_API_URL=server.url):
+                published = parser.sync_published()
+
+        self.assertEquals(sorted(chapter.chapter for chapter in published), [1, 3.5])
+        self.assertFalse(Chapter.objects.get(pk=self.chapters[1].pk).is_published)
+
+
+class RemangaStubServer:
+    def __init__(self, routes, failures=0, retry_after=None):
+        self.routes = routes
+        self.failures = failures
+        self.retry_after = retry_after
+        self.requests = []
+        self.responses = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.requests.append(self.path)
+                if stub.failures:
+                    stub.failures -= 1
+                    self.send_response(503)
+                    if stub.retry_after is not None:
+                        self.send_header('Retry-After', str(stub.retry_after))
+                    self.end_headers()
+                    return
+                if self.path not in stub.routes:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                body = json.dumps({'content': stub.routes[self.path]}).encode()
+                etag = '"%s"' % hash(body)
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def send_response(self, code, message=None):
+                stub.responses.append(code)
+                super().send_response(code, message)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_port}/'
+
+    def __enter__(self):
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class RemangaClientTestCase(TestCase):
+    def test_get_title(self):
+        with RemangaStubServer({'/titles/title/': {'rus_name': 'Тайтл'}}) as server:
+            content = RemangaClient(base_url=server.url).get_title('title')
+
+        self.assertEquals(content, {'rus_name': 'Тайтл'})
+        self.assertEquals(server.requests, ['/titles/title/'])
+
+    def test_get_title_not_found(self):
+        with RemangaStubServer({}) as server:
+            content = RemangaClient(base_url=server.url).get_title('title')
+
+        self.assertIsNone(content)
+
+    def test_retries_server_errors(self):
+        with RemangaStubServer({'/titles/title/': {'rus_name': 'Тайтл'}}, failures=2) as server:
+            content = RemangaClient(base_url=server.url, backoff=0).get_title('title')
+
+        self.assertEquals(content, {'rus_name': 'Тайтл'})
+        self.assertEquals(len(server.requests), 3)
+
+    def test_gives_up_after_retries(self):
+        with RemangaStubServer({'/titles/title/': {'rus_name': 'Тайтл'}}, failures=5) as server:
+            content = RemangaClient(base_url=server.url, backoff=0, retries=1).get_title('title')
+
+        self.assertIsNone(content)
+        self.assertEquals(len(server.requests), 2)
+
+    def test_caps_retry_after(self):
+        with RemangaStubServer({'/titles/title/': {'rus_name': 'Тайтл'}}, failures=1, retry_after=3600) as server:
+            content = RemangaClient(base_url=server.url, max_retry_delay=0).get_title('title')
+
+        self.assertEquals(content, {'rus_name': 'Тайтл'})
+        self.assertEquals(len(server.requests), 2)
+
+    def test_deadline_stops_retries(self):
+        with RemangaStubServer({'/titles/title/': {'rus_name': 'Тайтл'}}, failures=1, retry_after=3600) as server:
+            start = time.monotonic()
+            content = RemangaClient(base_url=server.url, deadline=1).get_title('title')
+
+        self.assertIsNone(content)
+        self.assertEquals(len(server.requests), 1)
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_cache_hit(self):
+        with RemangaStubServer({'/titles/title/': {'rus_name': 'Тайтл'}}) as server:
+            client = RemangaClient(base_url=server.url)
+            client.get_title('title')
+            content = client.get_title('title')
+
+        self.assertEquals(content, {'rus_name': 'Тайтл'})
+        self.assertEquals(len(server.requests), 1)
+
+    def test_cache_revalidation(self):
+        with RemangaStubServer({'/titles/title/': {'rus_name': 'Тайтл'}}) as server:
+            client = RemangaClient(base_url=server.url, cache_ttl=0)
+            client.get_title('title')
+            server.routes['/titles/title/'] = {'rus_name': 'Новый тайтл'}
+            changed_content = client.get_title('title')
+            content = client.get_title('title')
+
+        self.assertEquals(changed_content, {'rus_name': 'Новый тайтл'})
+        self.assertEquals(content, {'rus_name': 'Новый тайтл'})
+        self.assertEquals(len(server.requests), 3)
+        self.assertEquals(server.responses, [200, 200, 304])
+
+
+class UserRetrieveTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='user', password='1234',
+                                        roles=[Role.CLEANER, Role.TRANSLATOR, Role.TYPESETTER])
+        for slug in ('b-title', 'a-title', 'c-title'):
+            title = Title.objects.create(name=slug, slug=slug, img=None, release_frequency=ReleaseFrequency.WEEKLY)
+            WorkerTemplate.objects.create(title=title, user=self.user, role=Role.CLEANER)
+            if slug != 'c-title':
+                WorkerTemplate.objects.create(title=title, user=self.user, role=Role.TRANSLATOR)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_roles(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/users/{self.user.pk}')
+
+        roles = response.json()['content']['roles']
+        self.assertEquals([role['role'] for role in roles], [Role.CLEANER, Role.TRANSLATOR, Role.TYPESETTER])
+        self.assertEquals([title['slug'] for title in roles[0]['titles']], ['a-title', 'b-title', 'c-title'])
+        self.assertEquals([role['titles_count'] for role in roles], [3, 2, 0])
+
+
+class UserChaptersTestCase(TestCase):
+    def setUp(self):
+        title = create_title_with_workers()
+        for number in range(5):
+            chapter = Chapter.objects.create(title=title, tome=1, chapter=number, pages=10)
+            chapter.workers.get(role=Role.RAW_PROVIDER).upload(url='https://example.com/raw')
+        self.user = User.objects.get(username=f'user{Role.CLEANER}')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_list(self):
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/chapters', {'count': 3, 'page': 2})
+
+        data = response.json()
+        self.assertEquals(data['props'], {'total_items': 5, 'total_items_exact': True, 'total_pages': 2, 'page': 2})
+        self.assertEquals(len(data['content']), 2)
+        for worker in data['content']:
+            self.assertEquals(worker['title']['slug'], 'title')
+            self.assertEquals([url['role'] for url in worker['urls']], [Role.RAW_PROVIDER])
+            self.assertEquals(worker['urls'][0]['url'], 'https://example.com/raw')
+
+
+@shared_cache
+class RolesTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.curator = User.objects.create(username='curator', password='1234', roles=[Role.CURATOR])
+        self.user = User.objects.create(username='user', password='1234', roles=[Role.CLEANER, Role.TRANSLATOR])
+        self.client = APIClient()
+        self.client.force_authenticate(self.curator)
+
+    def get_roster(self):
+        content = self.client.get('/api/roles').json()['content']
+        return {item['role']: [user['username'] for user in item['users']] for item in content}
+
+    def test_roster(self):
+        with self.assertNumQueries(1):
+            roster = self.get_roster()
+        with self.assertNumQueries(0):
+            self.assertEquals(self.get_roster(), roster)
+
+        self.assertEquals(roster[Role.CURATOR], ['curator'])
+        self.assertEquals(roster[Role.CLEANER], ['user'])
+        self.assertEquals(roster[Role.TRANSLATOR], ['user'])
+        self.assertEquals(roster[Role.TYPESETTER], [])
+
+    def test_roster_invalidation(self):
+        self.get_roster()
+        self.client.put(f'/api/users/{self.user.pk}', {'roles': [Role.TYPESETTER]}, format='json')
+
+        roster = self.get_roster()
+        self.assertEquals(roster[Role.CLEANER], [])
+        self.assertEquals(roster[Role.TYPESETTER], ['user'])
+
+
+class PaymentManagerTestCase(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create(username=f'user{index}', password='1234', roles=[]) for index in range(3)]
+
+    def test_create(self):
+        user = self.users[0]
+        Payment.objects.create(user=user, amount=100, payment_type=PaymentType.IN)
+        payment = Payment.objects.create(user=user, amount=30, payment_type=PaymentType.OUT)
+
+        self.assertIsNotNone(payment.pk)
+        self.assertIsNotNone(payment.datetime)
+        self.assertEquals(user.balance, 70)
+        self.assertEquals(User.objects.get(pk=user.pk).balance, 70)
+
+    def test_create_stale_instance(self):
+        stale_user = User.objects.get(pk=self.users[0].pk)
+        Payment.objects.create(user=self.users[0], amount=100, payment_type=PaymentType.IN)
+        Payment.objects.create(user=stale_user, amount=50, payment_type=PaymentType.IN)
+
+        self.assertEquals(User.objects.get(pk=stale_user.pk).balance, 150)
+
+    def test_create_invalid_type(self):
+        with self.assertRaises(ValueError):
+            Payment.objects.create(user=self.users[0], amount=100, payment_type=3)
+
+    def test_bulk_pay(self):
+        payments = [Payment(user=user, amount=10 * (index + 1), type=PaymentType.IN)
+                    for index, user in enumerate(self.users)]
+        payments.append(Payment(user=self.users[0], amount=5, type=PaymentType.OUT))
+
+        with self.assertNumQueries(5):
+            Payment.objects.bulk_pay(payments)
+
+        balances = dict(User.objects.values_list('username', 'balance'))
+        self.assertEquals(balances, {'user0': 5, 'user1': 20, 'user2': 30})
+        self.assertEquals(Payment.objects.count(), 4)
+
+
+class BalanceSnapshotTestCase(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create(username=f'user{index}', password='1234', roles=[]) for index in range(2)]
+
+    def pay(self, user, amount, payment_type=PaymentType.IN):
+        Payment.objects.create(user=user, amount=amount, payment_type=payment_type)
+
+    def test_take(self):
+        self.pay(self.users[0], 100)
+        self.pay(self.users[0], 40, PaymentType.OUT)
+        snapshots = BalanceSnapshot.objects.take()
+
+        self.assertEquals([(snapshot.user_id, snapshot.balance) for snapshot in snapshots], [(self.users[0].pk, 60)])
+        self.assertEquals(BalanceSnapshot.objects.take(), [])
+
+        self.pay(self.users[0], 10)
+        self.pay(self.users[1], 20)
+        self.assertEquals(BalanceSnapshot.objects.get_balance(self.users[0]), 70)
+        self.assertEquals(BalanceSnapshot.objects.get_balances(), {self.users[0].pk: 70, self.users[1].pk: 20})
+        self.assertEquals([point['balance'] for point in BalanceSnapshot.objects.get_history(self.users[0])],
+                          [60, 70])
+
+        BalanceSnapshot.objects.take()
+        self.assertEquals(BalanceSnapshot.objects.get_balance(self.users[1]), 20)
+        self.assertEquals(BalanceSnapshot.objects.count(), 3)
+
+    def test_unsnapshotted_payments_query(self):
+        self.pay(self.users[0], 100)
+        BalanceSnapshot.objects.take()
+        self.pay(self.users[0], 10)
+        self.pay(self.users[1], 20)
+
+        # One query for the latest snapshots, then a plain range scan without a per-row subquery
+        with self.assertNumQueries(1):
+            payments = BalanceSnapshot.objects.get_unsnapshotted_payments()
+        self.assertEquals(str(payments.query).count('SELECT'), 1)
+        self.assertEquals(sorted(payments.values_list('amount', flat=True)), [10, 20])
+
+    def test_reconcile(self):
+        self.pay(self.users[0], 100)
+        BalanceSnapshot.objects.take()
+        self.pay(self.users[1], 50)
+        User.objects.filter(pk=self.users[1].pk).update(balance=80)
+
+        for full in (False, True):
+            self.assertEquals(BalanceSnapshot.objects.reconcile(full=full), [(self.users[1].pk, 'user1', 80, 50)])
+
+        call_command('reconcile_balances', '--fix', stdout=StringIO())
+        self.assertEquals(BalanceSnapshot.objects.reconcile(), [])
+        self.assertEquals(User.objects.get(pk=self.users[1].pk).balance, 50)
+
+
+class PaymentViewSetTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='user', password='1234', roles=[])
+        other_user = User.objects.create(username='other', password='1234', roles=[])
+        dates = [timezone.make_aware(datetime(2024, month, 15)) for month in (1, 1, 2, 3, 3)]
+        for index, date in enumerate(dates):
+            payment_type = PaymentType.OUT if index == 1 else PaymentType.IN
+            Payment(user=self.user, amount=10 * (index + 1), datetime=date, type=payment_type).save()
+        Payment(user=other_user, amount=1000, datetime=dates[0], type=PaymentType.IN).save()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_list(self):
+        amounts = []
+        params = {'count': 2}
+        while True:
+            data = self.client.get('/api/payments', params).json()
+            amounts.extend(payment['amount'] for payment in data['content'])
+            if data['props']['next_cursor'] is None:
+                break
+            params['cursor'] = data['props']['next_cursor']
+
+        self.assertEquals(amounts, [50, 40, 30, 20, 10])
+
+    def test_admin_user_filter(self):
+        self.user.is_admin = True
+        self.user.save()
+        other_user = User.objects.get(username='other')
+
+        data = self.client.get('/api/payments', {'user_id': other_user.pk}).json()
+        self.assertEquals([payment['amount'] for payment in data['content']], [1000])
+
+        response = self.client.get('/api/payments', {'user_id': 'abc'})
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(len(response.json()['content']), 5)
+
+    def test_sub_second_ties(self):
+        user = User.objects.create(username='payee', password='1234', roles=[])
+        tied = timezone.make_aware(datetime(2024, 4, 1, 12, 0, 0, 123456))
+        Payment.objects.bulk_pay([Payment(user=user, amount=amount, datetime=tied, type=PaymentType.IN)
+                                  for amount in range(1, 6)])
+        # Same millisecond, different microseconds
+        Payment.objects.bulk_pay([Payment(user=user, amount=6, datetime=tied.replace(microsecond=123999),
+                                          type=PaymentType.IN)])
+        self.client.force_authenticate(user)
+
+        amounts = []
+        params = {'count': 2}
+        while True:
+            data = self.client.get('/api/payments', params).json()
+            amounts.extend(payment['amount'] for payment in data['content'])
+            if data['props']['next_cursor'] is None:
+                break
+            params['cursor'] = data['props']['next_cursor']
+
+        self.assertEquals(amounts, [6, 5, 4, 3, 2, 1])
+
+    def test_filters(self):
+        data = self.client.get('/api/payments', {'type': PaymentType.IN, 'date_from': '2024-02-01',
+                                                 'date_to': '2024-03-15'}).json()
+
+        self.assertEquals([payment['amount'] for payment in data['content']], [50, 40, 30])
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/payments', {'cursor': 'invalid'})
+
+        self.assertEquals(response.status_code, 400)
+
+    def test_group_by_month(self):
+        data = self.client.get('/api/payments', {'group_by': 'month'}).json()
+
+        self.assertEquals(data['content'], [
+            {'period': '2024-03-01', 'income': 90, 'outcome': 0},
+            {'period': '2024-02-01', 'income': 30, 'outcome': 0},
+            {'period': '2024-01-01', 'income': 10, 'outcome': 20},
+        ])
+
+
+class DeadlinesTestCase(TestCase):
+    def setUp(self):
+        self.title = create_title_with_workers()
+        days_for_work = {Role.RAW_PROVIDER: 1, Role.CLEANER: 2, Role.TRANSLATOR: 3,
+                         Role.TYPESETTER: 7, Role.QUALITY_CHECKER: 5}
+        for worker in self.title.workers.exclude(role=Role.CURATOR):
+            worker.days_for_work = days_for_work[worker.role]
+            worker.save()
+        self.chapter = Chapter.objects.create(title=self.title, tome=1, chapter=1, pages=20)
+
+    def get_deadlines(self):
+        return {role: deadline - self.chapter.start_date if deadline else None
+                for role, deadline in self.chapter.workers.values_list('role', 'deadline')}
+
+    def upload(self, role, days):
+        worker = self.chapter.workers.get(role=role)
+        worker.upload(url='https://example.com')
+        Worker.objects.filter(pk=worker.pk).update(upload_time=timezone.localtime() + timezone.timedelta(days=days))
+
+    def test_initial_deadlines(self):
+        deadlines = self.get_deadlines()
+
+        self.assertTrue(self.chapter.workers.get(role=Role.CURATOR).is_done)
+        self.assertEquals(deadlines[Role.RAW_PROVIDER], timezone.timedelta(days=0))
+        self.assertIsNone(deadlines[Role.CLEANER])
+
+    def test_upload(self):
+        self.chapter.start_date = timezone.localdate()
+        self.chapter.save()
+        self.upload(Role.RAW_PROVIDER, days=0)
+        self.chapter.calculate_deadlines(Role.RAW_PROVIDER)
+        self.upload(Role.CLEANER, days=2)
+        self.upload(Role.TRANSLATOR, days=3)
+        worker = self.chapter.workers.get(role=Role.TRANSLATOR)
+
+        with self.assertNumQueries(2):
+            self.chapter.calculate_deadlines(worker.role)
+
+        deadlines = self.get_deadlines()
+        self.assertEquals(deadlines[Role.CLEANER], timezone.timedelta(days=2))
+        self.assertEquals(deadlines[Role.TRANSLATOR], timezone.timedelta(days=3))
+        self.assertEquals(deadlines[Role.TYPESETTER], timezone.timedelta(days=10))
+        self.assertIsNone(deadlines[Role.QUALITY_CHECKER])
+
+    def get_etas(self):
+        return {role: eta - self.chapter.start_date
+                for role, eta in self.chapter.workers.values_list('role', 'eta')}
+
+    def test_etas(self):
+        etas = self.get_etas()
+
+        self.assertEquals(etas[Role.CURATOR], timezone.timedelta(days=-1))
+        self.assertEquals(etas[Role.RAW_PROVIDER], timezone.timedelta(days=0))
+        self.assertEquals(etas[Role.CLEANER], timezone.timedelta(days=2))
+        self.assertEquals(etas[Role.TRANSLATOR], timezone.timedelta(days=3))
+        self.assertEquals(etas[Role.TYPESETTER], timezone.timedelta(days=10))
+        self.assertEquals(etas[Role.QUALITY_CHECKER], timezone.timedelta(days=15))
+
+    def test_etas_on_upload(self):
+        self.upload(Role.RAW_PROVIDER, days=0)
+        self.chapter.calculate_deadlines(Role.RAW_PROVIDER)
+        self.upload(Role.TRANSLATOR, days=5)
+        self.chapter.calculate_deadlines(Role.TRANSLATOR)
+
+        etas = self.get_etas()
+        translator_eta = timezone.localdate() + timezone.timedelta(days=5) - self.chapter.start_date
+        self.assertEquals(etas[Role.TRANSLATOR], translator_eta)
+        self.assertEquals(etas[Role.TYPESETTER], translator_eta + timezone.timedelta(days=7))
+        self.assertEquals(etas[Role.QUALITY_CHECKER], translator_eta + timezone.timedelta(days=12))
+
+    def test_calculate_etas(self):
+        Worker.objects.update(eta=None)
+
+        with self.assertNumQueries(3):
+            changed = Chapter.objects.calculate_etas()
+
+        self.assertEquals(len(changed), len(Role.values))
+        self.assertEquals(self.get_etas()[Role.QUALITY_CHECKER], timezone.timedelta(days=15))
+
+    def test_release_calendar(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create(username='curator', password='1234', roles=[Role.CURATOR]))
+        release_date = self.chapter.start_date + timezone.timedelta(days=15)
+
+        content = client.get('/api/calendar', {'date_from': release_date.isoformat()}).json()['content']
+        self.assertEquals([(item['id'], item['release_date']) for item in content],
+                          [(self.chapter.pk, release_date.isoformat())])
+
+        content = client.get('/api/calendar', {'date_to': self.chapter.start_date.isoformat()}).json()['content']
+        self.assertEquals(content, [])
+
+    def test_release_calendar_cursor(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create(username='curator', password='1234', roles=[Role.CURATOR]))
+        for number in range(2, 6):
+            Chapter.objects.create(title=self.title, tome=1, chapter=number, pages=20)
+        # Chapters without workers have no release date and are listed last
+        Chapter.objects.bulk_create([Chapter(title=self.title, tome=2, chapter=number, pages=20,
+                                             start_date=timezone.localdate()) for number in (1, 2)])
+        expected = [item['id'] for item in client.get('/api/calendar', {'count': 40}).json()['content']]
+
+        ids = []
+        params = {'count': 2, 'cursor': ''}
+        while True:
+            response = client.get('/api/calendar', params)
+            self.assertEquals(response.status_code, 200)
+            data = response.json()
+            ids.extend(item['id'] for item in data['content'])
+            if data['props']['next_cursor'] is None:
+                break
+            params['cursor'] = data['props']['next_cursor']
+
+        self.assertEquals(len(expected), 7)
+        self.assertEquals(ids, expected)
+
+    def test_calculate_deadlines_for_many_chapters(self):
+        chapters = [self.chapter] + [Chapter.objects.create(title=self.title, tome=1, chapter=number, pages=20)
+                                     for number in (2, 3)]
+        Worker.objects.filter(role=Role.RAW_PROVIDER).update(days_for_work=4)
+
+        with self.assertNumQueries(3):
+            changed = Chapter.objects.calculate_deadlines(chapters)
+
+        # Raw provider deadlines moved and expected dates of every pending role followed them
+        self.assertEquals(len(changed), 3 * (len(Role.values) - 1))
+        self.assertEquals(self.get_deadlines()[Role.RAW_PROVIDER], timezone.timedelta(days=3))
+        self.assertEquals(self.get_etas()[Role.QUALITY_CHECKER], timezone.timedelta(days=18))
+
+    def get_workers_data(self, workers, raw_provider_days):
+        return [{'role': worker.role, 'rate': worker.rate, 'is_paid_by_pages': worker.is_paid_by_pages,
+                 'user': worker.user_id,
+                 'days_for_work': raw_provider_days if worker.role == Role.RAW_PROVIDER else worker.days_for_work}
+                for worker in workers]
+
+    def test_title_update_moves_deadlines(self):
+        workers = self.get_workers_data(self.title.workers.all(), raw_provider_days=4)
+        serializer = TitleUpdateSerializer(self.title, data={'workers': workers,
+                                                             'release_frequency': ReleaseFrequency.WEEKLY})
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+
+        self.assertEquals(self.get_deadlines()[Role.RAW_PROVIDER], timezone.timedelta(days=3))
+        self.assertEquals(self.get_etas()[Role.QUALITY_CHECKER], timezone.timedelta(days=18))
+
+    def test_chapter_update_moves_deadlines(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.get(username=f'user{Role.CURATOR}'))
+        workers = self.get_workers_data(self.chapter.workers.all(), raw_provider_days=4)
+        response = client.put(f'/api/titles/chapters/{self.chapter.pk}', {
+            'tome': 1, 'chapter': 1, 'pages': 20, 'workers': workers,
+        }, format='json')
+
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(self.get_deadlines()[Role.RAW_PROVIDER], timezone.timedelta(days=3))
+        self.assertEquals(self.get_etas()[Role.QUALITY_CHECKER], timezone.timedelta(days=18))
+
+
+class WorkflowTestCase(TestCase):
+    no_cleaner = {
+        Role.CURATOR: [],
+        Role.RAW_PROVIDER: [Role.CURATOR],
+        Role.TRANSLATOR: [Role.RAW_PROVIDER],
+        Role.TYPESETTER: [Role.TRANSLATOR],
+        Role.QUALITY_CHECKER: [Role.TYPESETTER],
+    }
+
+    def test_default_workflow(self):
+        workflow = get_workflow()
+
+        self.assertIs(workflow, get_workflow(RoleExtra.dependencies))
+        self.assertEquals(workflow.roles, tuple(Role.values))
+        self.assertEquals(workflow.first_roles, {RoleExtra.first_role})
+        self.assertEquals(workflow.last_roles, {RoleExtra.last_role})
+        for role in Role.values:
+            self.assertEquals(set(workflow.continuations[role]), set(RoleExtra.continuations[role]))
+
+    def test_is_ready(self):
+        workflow = get_workflow()
+        done_mask = workflow.mask_of([Role.CURATOR, Role.RAW_PROVIDER, Role.CLEANER])
+
+        self.assertTrue(workflow.is_ready(Role.TRANSLATOR, done_mask))
+        self.assertFalse(workflow.is_ready(Role.TYPESETTER, done_mask))
+
+    def test_invalid_workflow(self):
+        for dependencies in ({Role.RAW_PROVIDER: []},
+                             {Role.CURATOR: [], Role.RAW_PROVIDER: [Role.CLEANER]},
+                             {Role.CURATOR: [], Role.RAW_PROVIDER: [Role.CLEANER], Role.CLEANER: [Role.RAW_PROVIDER]}):
+            with self.assertRaises(ValueError):
+                get_workflow(dependencies)
+
+    def test_chapter_without_cleaner(self):
+        title = create_title_with_workers(workflow={str(role): deps for role, deps in self.no_cleaner.items()})
+        title.refresh_from_db()
+        chapter = Chapter.objects.create(title=title, tome=1, chapter=1, pages=10)
+
+        for role in (Role.RAW_PROVIDER, Role.TRANSLATOR):
+            chapter.workers.get(role=role).upload(url='https://example.com')
+        self.assertIsNotNone(chapter.workers.get(role=Role.TYPESETTER).deadline)
+        self.assertFalse(chapter.workers.filter(role=Role.CLEANER).exists())
+
+        for role in (Role.TYPESETTER, Role.QUALITY_CHECKER):
+            chapter.workers.get(role=role).upload(url='https://example.com')
+        self.assertEquals(Chapter.objects.get(pk=chapter.pk).end_date, timezone.localdate())
+
+    def test_validate_workers(self):
+        title = create_title_with_workers()
+        workers = [{'role': worker.role, 'rate': 10, 'is_paid_by_pages': False, 'user': worker.user_id,
+                    'days_for_work': 2} for worker in title.workers.exclude(role=Role.CLEANER)]
+        data = {'workers': workers, 'release_frequency': ReleaseFrequency.WEEKLY}
+
+        serializer = TitleUpdateSerializer(title, data=data)
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('workers', serializer.errors)
+
+        serializer = TitleUpdateSerializer(title, data={**data, 'workflow': self.no_cleaner})
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+
+        serializer = TitleUpdateSerializer(title, data={**data, 'workflow': {Role.CURATOR: [Role.CURATOR]}})
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('workflow', serializer.errors)
+
+    def test_update_workflow(self):
+        title = create_title_with_workers()
+        workers = [{'role': worker.role, 'rate': 10, 'is_paid_by_pages': False, 'user': worker.user_id,
+                    'days_for_work': 2} for worker in title.workers.exclude(role=Role.CLEANER)]
+        data = {'workers': workers, 'release_frequency': ReleaseFrequency.WEEKLY}
+
+        serializer = TitleUpdateSerializer(title, data={**data, 'workflow': self.no_cleaner})
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+        self.assertFalse(title.workers.filter(role=Role.CLEANER).exists())
+        self.assertEquals(set(title.workers.values_list('rate', flat=True)), {10})
+
+        cleaner = {'role': Role.CLEANER, 'rate': 20, 'is_paid_by_pages': True, 'user': None, 'days_for_work': 3}
+        serializer = TitleUpdateSerializer(title, data={**data, 'workers': workers + [cleaner], 'workflow': None})
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+        self.assertEquals(title.workers.get(role=Role.CLEANER).rate, 20)
+        self.assertEquals(title.workers.count(), len(Role.values))
+
+    def test_existing_chapter_across_workflow_change(self):
+        title = create_title_with_workers()
+        chapter = Chapter.objects.create(title=title, tome=1, chapter=1, pages=10)
+        workers = [{'role': worker.role, 'rate': 10, 'is_paid_by_pages': False, 'user': worker.user_id,
+                    'days_for_work': 2} for worker in title.workers.exclude(role=Role.CLEANER)]
+        serializer = TitleUpdateSerializer(title, data={'workers': workers, 'workflow': self.no_cleaner,
+                                                        'release_frequency': ReleaseFrequency.WEEKLY})
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+        self.assertFalse(chapter.workers.filter(role=Role.CLEANER).exists())
+
+        client = APIClient()
+        client.force_authenticate(User.objects.get(username=f'user{Role.CURATOR}'))
+        response = client.put(f'/api/titles/chapters/{chapter.pk}', {
+            'tome': 1, 'chapter': 1, 'pages': 10, 'workers': workers,
+        }, format='json')
+        self.assertEquals(response.status_code, 200)
+
+        for role in (Role.RAW_PROVIDER, Role.TRANSLATOR, Role.TYPESETTER, Role.QUALITY_CHECKER):
+            chapter.workers.get(role=role).upload(url='https://example.com')
+        self.assertEquals(Chapter.objects.get(pk=chapter.pk).end_date, timezone.localdate())
+        self.assertEquals(len(Chapter.objects.publish([chapter])), 1)
+        self.assertEquals(Payment.objects.count(), len(workers))
+
+    def test_publish_ignores_dropped_roles(self):
+        title = create_title_with_workers()
+        chapter = Chapter.objects.create(title=title, tome=1, chapter=1, pages=10)
+        chapter.workers.exclude(role=Role.CLEANER).update(is_done=True)
+        self.assertEquals(Chapter.objects.publish([chapter]), [])
+
+        Title.objects.filter(pk=title.pk).update(workflow={str(role): deps for role, deps in self.no_cleaner.items()})
+        self.assertEquals(len(Chapter.objects.publish([chapter])), 1)
+        self.assertFalse(Payment.objects.filter(worker__role=Role.CLEANER).exists())
+
+
+class ChapterBulkCreateTestCase(TestCase):
+    def setUp(self):
+        self.title = create_title_with_workers()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username='curator', password='1234', roles=[Role.CURATOR]))
+
+    def test_create_many(self):
+        chapters_data = [{'tome': 2, 'chapter': number, 'pages': 20} for number in range(1, 31)]
+
+        # Templates, savepoint, chapters, workers and savepoint release
+        with self.assertNumQueries(5):
+            chapters = Chapter.objects.create_many(self.title, chapters_data)
+
+        self.assertEquals(len(chapters), 30)
+        self.assertEquals(Worker.objects.count(), 30 * len(Role.values))
+        for chapter in chapters:
+            raw_provider = chapter.workers.get(role=Role.RAW_PROVIDER)
+            self.assertEquals(raw_provider.deadline,
+                              chapter.start_date + timezone.timedelta(days=raw_provider.days_for_work - 1))
+            self.assertTrue(chapter.workers.get(role=Role.CURATOR).is_done)
+            self.assertIsNone(chapter.workers.get(role=Role.CLEANER).deadline)
+            self.assertIsNotNone(chapter.workers.get(role=Role.QUALITY_CHECKER).eta)
+
+    def test_bulk_endpoint(self):
+        start_date = timezone.localdate() + timezone.timedelta(days=3)
+        response = self.client.post('/api/titles/chapters/bulk', {'title': self.title.pk, 'chapters': [
+            {'tome': 1, 'chapter': 1, 'pages': 10},
+            {'tome': 1, 'chapter': 1.5, 'pages': 12, 'start_date': start_date.isoformat()},
+        ]}, format='json')
+
+        self.assertEquals(response.status_code, 201)
+        content = response.json()['content']
+        self.assertEquals([chapter['chapter'] for chapter in content], ['1', '1.5'])
+        self.assertEquals(content[1]['start_date'], start_date.isoformat())
+
+    def test_bulk_endpoint_validation(self):
+        response = self.client.post('/api/titles/chapters/bulk', {'title': self.title.pk, 'chapters': []},
+                                    format='json')
+
+        self.assertEquals(response.status_code, 400)
+        self.assertFalse(Chapter.objects.exists())
+
+
+class CursorPaginationTestCase(TestCase):
+    def setUp(self):
+        self.title = Title.objects.create(name='title', slug='title', img=None, release_frequency=ReleaseFrequency.WEEKLY)
+        for name in ('b', 'a', 'c', 'a'):
+            Title.objects.create(name=name, slug=f'{name}-{Title.objects.count()}', img=None,
+                                 release_frequency=ReleaseFrequency.WEEKLY)
+        Chapter.objects.create_many(self.title, [{'tome': tome, 'chapter': chapter, 'pages': 10}
+                                                 for tome in (1, 2) for chapter in (1, 2, 2.5)])
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username='curator', password='1234', roles=[Role.CURATOR]))
+
+    def get_all(self, url, key, params):
+        values = []
+        params = {**params, 'count': 2, 'cursor': ''}
+        while True:
+            data = self.client.get(url, params).json()
+            values.extend(item[key] for item in data['content'])
+            if data['props']['next_cursor'] is None:
+                return values, data['props']
+            params['cursor'] = data['props']['next_cursor']
+
+    def test_titles(self):
+        names, props = self.get_all('/api/titles', 'name', {})
+
+        self.assertEquals(names, ['a', 'a', 'b', 'c', 'title'])
+        self.assertNotIn('total_items', props)
+
+    def test_chapters(self):
+        chapters, props = self.get_all('/api/titles/chapters', 'chapter', {'title_id': self.title.pk, 'total': 1})
+
+        self.assertEquals(chapters, ['2.5', '2', '1', '2.5', '2', '1'])
+        self.assertEquals(props['total_items'], 6)
+
+        chapters, props = self.get_all('/api/titles/chapters', 'chapter', {'title_id': self.title.pk, 'reverse': 1})
+        self.assertEquals(chapters, ['1', '2', '2.5', '1', '2', '2.5'])
+
+    def test_page_numbers_still_work(self):
+        data = self.client.get('/api/titles', {'count': 2, 'page': 3}).json()
+
+        self.assertEquals(data['props'], {'total_items': 5, 'total_items_exact': True, 'total_pages': 3, 'page': 3})
+        self.assertEquals(len(data['content']), 1)
+
+
+@shared_cache
+class CountingTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.title = create_title_with_workers()
+
+    def test_cached_count(self):
+        counter = CachedCounter()
+        queryset = Worker.objects.filter(chapter__title=self.title)
+        Chapter.objects.create(title=self.title, tome=1, chapter=1, pages=10)
+
+        self.assertEquals(counter.count(queryset), (len(Role.values), True))
+        with self.assertNumQueries(0):
+            self.assertEquals(counter.count(queryset), (len(Role.values), True))
+
+        Chapter.objects.create(title=self.title, tome=1, chapter=2, pages=10)
+        self.assertEquals(counter.count(queryset), (2 * len(Role.values), True))
+
+        Worker.objects.filter(chapter__chapter=2).delete()
+        self.assertEquals(counter.count(queryset), (len(Role.values), True))
+
+    def test_estimated_count(self):
+        Chapter.objects.create_many(self.title, [{'tome': 1, 'chapter': number, 'pages': 10} for number in range(20)])
+
+        count, is_exact = EstimatedCounter(threshold=1).count(Worker.objects.filter(chapter__title=self.title))
+        self.assertFalse(is_exact)
+        self.assertGreater(count, 0)
+
+        count, is_exact = EstimatedCounter(threshold=10 ** 9).count(Worker.objects.all())
+        self.assertEquals((count, is_exact), (20 * len(Role.values), True))
+
+
+@shared_cache
+class TokenCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        ScanlateTokenAuthentication.token_cache = None
+        self.admin = User.objects.create(username='admin', password='1234', roles=[])
+        self.admin.is_admin = True
+        self.admin.save()
+        self.user = User.objects.create(username='user', password='1234', roles=[Role.CLEANER])
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + Token.objects.create(user=self.user).key)
+
+    def get_current(self):
+        return self.client.get('/api/users/current').json()['content']
+
+    def test_cached_authentication(self):
+        with self.assertNumQueries(1):
+            self.assertEquals(self.get_current()['id'], self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertEquals(self.get_current()['id'], self.user.pk)
+
+        response = APIClient().get('/api/users/current', HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEquals(response.status_code, 401)
+
+    def test_roles_invalidation(self):
+        self.assertFalse(self.get_current()['is_curator'])
+
+        admin_client = APIClient()
+        admin_client.force_authenticate(self.admin)
+        admin_client.put(f'/api/users/{self.user.pk}', {'roles': [Role.CURATOR]}, format='json')
+
+        self.assertTrue(self.get_current()['is_curator'])
+
+    def test_balance_invalidation(self):
+        self.assertEquals(self.get_current()['balance'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            Payment.objects.create(self.user, 100, PaymentType.IN)
+        self.assertEquals(self.get_current()['balance'], 100)
+
+    def test_password_and_delete_invalidation(self):
+        self.get_current()
+        self.client.post('/api/auth/change-password', {'password': 'Zx8!long-password'}, format='json')
+        with self.assertNumQueries(1):
+            self.get_current()
+
+        admin_client = APIClient()
+        admin_client.force_authenticate(self.admin)
+        admin_client.delete(f'/api/users/{self.user.pk}')
+        self.assertEquals(self.client.get('/api/users/current').status_code, 401)
+
+    def test_status_keeps_roles(self):
+        self.get_current()
+        User.objects.filter(pk=self.user.pk).update(roles=[Role.CURATOR])
+
+        # The cached user still has the old roles, they must not be written back
+        self.client.put('/api/users/status', {'status': Status.VACATION}, format='json')
+        self.user.refresh_from_db()
+        self.assertEquals(self.user.status, Status.VACATION)
+        self.assertEquals(self.user.roles, [Role.CURATOR])
+
+    def test_local_cache_disabled(self):
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.get_current()
+            with self.assertNumQueries(1):
+                self.get_current()
+
+
+@shared_cache
+class AccessTokenTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='curator', password='1234', roles=[Role.CURATOR])
+        self.client = APIClient()
+
+    def login(self):
+        response = self.client.post('/api/auth/login', {'login': 'curator', 'password': '1234'}, format='json')
+        return response.json()['content']
+
+    def test_stateless_access(self):
+        content = self.login()
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + content['access_token'])
+
+        self.client.get('/api/roles')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/roles')
+        self.assertEquals(response.status_code, 200)
+
+        self.assertEquals(self.client.get('/api/users/current').json()['content']['id'], self.user.pk)
+
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + content['access_token'][:-1] + 'x')
+        self.assertEquals(self.client.get('/api/roles').status_code, 401)
+
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + content['token'])
+        self.assertEquals(self.client.get('/api/roles').status_code, 200)
+
+    def test_expired_access_token(self):
+        content = self.login()
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + content['access_token'])
+        with override_settings(ACCESS_TOKEN_LIFETIME=-1):
+            self.assertEquals(self.client.get('/api/roles').status_code, 401)
+
+    def test_refresh_rotation(self):
+        refresh_token = self.login()['refresh_token']
+
+        response = self.client.post('/api/auth/refresh', {'refresh_token': refresh_token}, format='json')
+        self.assertEquals(response.status_code, 200)
+        rotated = response.json()['content']['refresh_token']
+        self.assertNotEquals(rotated, refresh_token)
+
+        # Reusing a rotated token revokes the whole chain
+        response = self.client.post('/api/auth/refresh', {'refresh_token': refresh_token}, format='json')
+        self.assertEquals(response.status_code, 401)
+        response = self.client.post('/api/auth/refresh', {'refresh_token': rotated}, format='json')
+        self.assertEquals(response.status_code, 401)
+
+    def test_revoke(self):
+        content = self.login()
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + content['access_token'])
+        response = self.client.post('/api/auth/revoke', {'refresh_token': content['refresh_token']}, format='json')
+        self.assertEquals(response.status_code, 200)
+
+        response = self.client.post('/api/auth/refresh', {'refresh_token': content['refresh_token']}, format='json')
+        self.assertEquals(response.status_code, 401)
+
+    def test_expired_refresh_token(self):
+        refresh_token = self.login()['refresh_token']
+        rotated = self.client.post('/api/auth/refresh', {'refresh_token': refresh_token},
+                                   format='json').json()['content']['refresh_token']
+        RefreshToken.objects.filter(key_hash=RefreshToken.objects.hash_key(refresh_token)).update(
+            expires=timezone.now())
+
+        # An expired token is rejected without revoking the rest of the chain
+        response = self.client.post('/api/auth/refresh', {'refresh_token': refresh_token}, format='json')
+        self.assertEquals(response.status_code, 401)
+        response = self.client.post('/api/auth/refresh', {'refresh_token': rotated}, format='json')
+        self.assertEquals(response.status_code, 200)
+
+    def test_prune_refresh_tokens(self):
+        for _ in range(3):
+            self.login()
+        RefreshToken.objects.filter(pk__in=RefreshToken.objects.values('pk')[:2]).update(expires=timezone.now())
+
+        out = StringIO()
+        call_command('prune_refresh_tokens', stdout=out)
+        self.assertIn('Deleted 2 refresh tokens.', out.getvalue())
+        self.assertEquals(RefreshToken.objects.count(), 1)
+
+        RefreshToken.objects.update(expires=timezone.now())
+        refresh_token = self.login()['refresh_token']
+        self.client.post('/api/auth/refresh', {'refresh_token': refresh_token}, format='json')
+        # Rotation prunes expired tokens of the user and keeps the revoked one for reuse detection
+        self.assertEquals(RefreshToken.objects.filter(user=self.user).count(), 2)
+
+
+class LoginTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='user', password='1234', roles=[])
+        self.client = APIClient()
+
+    def login(self, password='1234'):
+        return self.client.post('/api/auth/login', {'login': 'user', 'password': password}, format='json')
+
+    def test_rehash_on_login(self):
+        self.assertTrue(self.user.password.startswith('scrypt$'))
+        self.user.password = make_password('1234', hasher='pbkdf2_sha256')
+        self.user.save()
+
+        self.assertEquals(self.login().status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('scrypt$'))
+        self.assertEquals(self.login().status_code, 200)
+
+    def test_login_throttling(self):
+        for _ in range(10):
+            self.login(password='wrong')
+
+        response = self.login()
+        self.assertEquals(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+    def test_throttling_ignores_spoofed_forwarded_for(self):
+        for i in range(10):
+            self.client.post('/api/auth/login', {'login': 'user', 'password': 'wrong'}, format='json',
+                             HTTP_X_FORWARDED_FOR=f'10.0.0.{i}, 192.168.0.1')
+
+        response = self.client.post('/api/auth/login', {'login': 'user', 'password': '1234'}, format='json',
+                                    HTTP_X_FORWARDED_FOR='10.0.1.1, 192.168.0.1')
+        self.assertEquals(response.status_code, 429)
+
+
+@shared_cache
+@override_settings(QUERY_PROFILER=False, QUERY_PROFILER_HEADER=True, QUERY_PROFILER_N_PLUS_ONE_THRESHOLD=3)
+class QueryProfilerTestCase(TestCase):
+    def setUp(self):
+        self.title = create_title_with_workers()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.get(username=f'user{Role.CURATOR}'))
+
+    def test_disabled_without_header(self):
+        response = self.client.get('/api/titles')
+        self.assertNotIn('X-Query-Count', response)
+
+    def test_headers_and_log(self):
+        with self.assertLogs('scanlate.queries', 'INFO') as logs:
+            response = self.client.get('/api/titles', HTTP_X_PROFILE_QUERIES='1')
+        self.assertEquals(response['X-Query-Count'], '1')
+        self.assertEquals(response['X-Query-Repeated'], '0')
+
+        log = json.loads(logs.records[0].args[0])
+        self.assertEquals(log['view'], 'scanlate.views.TitleViewSet')
+        self.assertEquals(log['queries'], 1)
+
+    def test_n_plus_one(self):
+        with self.assertLogs('scanlate.queries', 'WARNING') as logs:
+            self.client.get(f'/api/titles/{self.title.slug}', HTTP_X_PROFILE_QUERIES='1')
+
+        suspect = json.loads(logs.records[0].args[0])['n_plus_one'][0]
+        self.assertEquals(suspect['count'], len(Role.values))
+        self.assertEquals(suspect['serializer'], 'UserNestedSerializer')
+
+
+class IndexPlanTestCase(TestCase):
+    def setUp(self):
+        self.titles = [create_title_with_workers(slug=f'title{index}') for index in range(3)]
+        for title in self.titles:
+            Chapter.objects.create_many(title, [{'tome': 1, 'chapter': number, 'pages': 10} for number in range(30)])
+        self.user = User.objects.get(username=f'user{Role.CLEANER}')
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+            # Tables are tiny, forbid sequential scans so the planner shows which index it would use
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def assertUsesIndex(self, queryset):
+        plan = queryset.explain()
+        self.assertIn('Index', plan, plan)
+        self.assertNotIn('Seq Scan', plan, plan)
+
+    def test_hot_queries(self):
+        title = self.titles[0]
+        chapter = title.chapters.first()
+
+        self.assertUsesIndex(Worker.objects.filter(user=self.user, is_done=False).exclude(deadline=None))
+        self.assertUsesIndex(Worker.objects.filter(user=self.user, is_done=True).exclude(deadline=None))
+        self.assertUsesIndex(Worker.objects.filter(chapter=chapter, role=Role.CLEANER))
+        self.assertUsesIndex(Chapter.objects.filter(title=title, is_published=False).order_by('tome', 'chapter'))
+        self.assertUsesIndex(WorkerTemplate.objects.filter(title=title, user=self.user, role=Role.CLEANER))
+        self.assertUsesIndex(User.objects.filter(roles__overlap=[Role.CLEANER]).order_by())
+
+
+class UniqueRolesTestCase(TestCase):
+    def setUp(self):
+        self.title = create_title_with_workers()
+        self.chapter = Chapter.objects.create(title=self.title, tome=1, chapter=1, pages=10)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.get(username=f'user{Role.CURATOR}'))
+
+    def test_constraints(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Worker.objects.create(chapter=self.chapter, role=Role.CLEANER, is_paid_by_pages=False, days_for_work=1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            WorkerTemplate.objects.create(title=self.title, role=Role.CLEANER)
+
+    def test_update_workers_by_role(self):
+        workers_data = [
+            {'role': worker.role, 'rate': worker.role * 10, 'is_paid_by_pages': True,
+             'user': worker.user_id, 'days_for_work': worker.role + 1}
+            for worker in self.chapter.workers.all()
+        ]
+        response = self.client.put(f'/api/titles/chapters/{self.chapter.pk}', {
+            'tome': 1, 'chapter': 2, 'pages': 10, 'workers': workers_data[::-1],
+        }, format='json')
+
+        self.assertEquals(response.status_code, 200)
+        for worker in self.chapter.workers.all():
+            self.assertEquals((worker.rate, worker.days_for_work), (worker.role * 10, worker.role + 1))
+
+
+class LoadTestCommandTestCase(TestCase):
+    def test_compare_servers(self):
+        with RemangaStubServer({'/api/healthcheck/': 'ok'}) as first, RemangaStubServer({}) as second:
+            out = StringIO()
+            call_command('loadtest', first.url, second.url, requests=20, concurrency=4, stdout=out)
+
+        self.assertEquals(len(first.requests), 20)
+        lines = out.getvalue().splitlines()
+        self.assertIn('(1.00x)', lines[0])
+        self.assertIn('0 errors', lines[0])
+        self.assertIn('20 errors', lines[1])
+
+
+class ConnectionBudgetTestCase(TestCase):
+    def test_check(self):
+        with override_settings(SERVER_WORKERS=33, SERVER_THREADS=4, POSTGRES_CONNECTION_BUDGET=80):
+            self.assertEquals([warning.id for warning in check_connection_budget(None)], ['scanlate.W001'])
+        with override_settings(SERVER_WORKERS=20, SERVER_THREADS=4, POSTGRES_CONNECTION_BUDGET=80):
+            self.assertEquals(check_connection_budget(None), [])
+
+
+class ConnectionBenchmarkTestCase(TransactionTestCase):
+    def test_connection_reuse(self):
+        # The benchmark runs in its own thread, the title has to be committed to be visible there
+        Title.objects.create(name='title', slug='title', img='https://example.com/img.jpg',
+                             release_frequency=ReleaseFrequency.WEEKLY)
+        out = StringIO()
+        call_command('benchmark_connections', requests=5, modes=['per-request', 'persistent'], stdout=out)
+
+        per_request, persistent = out.getvalue().splitlines()
+        self.assertIn('5 connections opened', per_request)
+        self.assertIn('1 connections opened', persistent)
+
+
+@shared_cache
+class ResponseCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.title = create_title_with_workers()
+        self.chapter = Chapter.objects.create(title=self.title, tome=1, chapter=1, pages=10)
+        self.curator = User.objects.get(username=f'user{Role.CURATOR}')
+        self.client = APIClient()
+
+    def test_local_cache_disabled(self):
+        self.client.force_authenticate(self.curator)
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.client.get('/api/titles')
+            response = self.client.get('/api/titles')
+        self.assertNotIn('X-Cache', response)
+
+    def test_other_apps_fast_delete(self):
+        Token.objects.create(user=self.curator)
+        with self.assertNumQueries(1):
+            Token.objects.filter(user=self.curator).delete()
+
+    def test_title_list(self):
+        self.assertEquals(self.client.get('/api/titles')['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/titles')
+        self.assertEquals(response['X-Cache'], 'HIT')
+        self.assertEquals(self.client.get('/api/titles?page=2')['X-Cache'], 'MISS')
+
+        self.title.name = 'renamed'
+        self.title.save()
+        response = self.client.get('/api/titles')
+        self.assertEquals(response['X-Cache'], 'MISS')
+        self.assertEquals(response.json()['content'][0]['name'], 'renamed')
+
+    def test_title_retrieve_buckets(self):
+        worker_template = self.title.workers.get(role=Role.CLEANER)
+        self.client.force_authenticate(worker_template.user)
+        user_response = self.client.get(f'/api/titles/{self.title.slug}').json()
+
+        self.client.force_authenticate(self.curator)
+        curator_response = self.client.get(f'/api/titles/{self.title.slug}')
+        self.assertEquals(curator_response['X-Cache'], 'MISS')
+        self.assertNotEquals(curator_response.json(), user_response)
+
+        WorkerTemplate.objects.filter(pk=worker_template.pk).update(rate=1)
+        response = self.client.get(f'/api/titles/{self.title.slug}')
+        self.assertEquals(response['X-Cache'], 'MISS')
+        rates = {worker['role']: worker['rate'] for worker in response.json()['content']['workers']}
+        self.assertEquals(rates[Role.CLEANER], 1)
+
+    def test_chapter_list(self):
+        self.client.force_authenticate(self.curator)
+        url = f'/api/titles/chapters?title_id={self.title.pk}'
+        self.client.get(url)
+        self.assertEquals(self.client.get(url)['X-Cache'], 'HIT')
+
+        self.chapter.workers.filter(role=Role.CLEANER).update(is_done=True)
+        self.assertEquals(self.client.get(url)['X-Cache'], 'MISS')
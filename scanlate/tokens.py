@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core import signing
+
+from .models import RefreshToken
+
+ACCESS_TOKEN_SALT = 'scanlate.access'
+
+
+def create_access_token(user):
+    claims = {'id': user.pk, 'is_admin': user.is_admin, 'roles': list(user.roles)}
+    return signing.dumps(claims, salt=ACCESS_TOKEN_SALT, compress=True)
+
+
+def verify_access_token(token):
+    """Returns the claims of a signed access token, raises signing.BadSignature if it is forged or expired."""
+    return signing.loads(token, salt=ACCESS_TOKEN_SALT, max_age=settings.ACCESS_TOKEN_LIFETIME)
+
+
+def is_access_token(token):
+    # Signed tokens are "payload:timestamp:signature", database tokens are plain hex keys
+    return ':' in token
+
+
+def issue_tokens(user, refresh_token=None):
+    return {
+        'access_token': create_access_token(user),
+        'refresh_token': refresh_token or RefreshToken.objects.issue(user),
+        'expires_in': settings.ACCESS_TOKEN_LIFETIME,
+    }
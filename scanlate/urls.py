@@ -8,6 +8,7 @@ router.register(r'titles/chapters/workers', views.WorkerViewSet)
 router.register(r'titles/chapters', views.ChapterViewSet)
 router.register(r'titles', views.TitleViewSet)
 router.register(r'users', views.UserViewSet)
+router.register(r'payments', views.PaymentViewSet)
 
 urlpatterns = [
     re_path(r'healthcheck/?$', views.HealthCheckAPIView.as_view()),
@@ -16,10 +17,13 @@ urlpatterns = [
     re_path(r'auth/register/?$', views.UserRegisterAPIView.as_view()),
     re_path(r'auth/login/?$', views.UserLoginAPIView.as_view()),
     re_path(r'auth/change-password/?$', views.UserChangePassword.as_view()),
+    re_path(r'auth/refresh/?$', views.TokenRefreshAPIView.as_view()),
+    re_path(r'auth/revoke/?$', views.TokenRevokeAPIView.as_view()),
 
     # Chapters
     re_path(r'chapters/?$', views.UserChaptersAPIView.as_view()),
     re_path(r'roles/?$', views.RolesAPIView.as_view()),
+    re_path(r'calendar/?$', views.ReleaseCalendarAPIView.as_view()),
 
     # Router
     path('', include(router.urls)),
@@ -1,14 +1,20 @@
 from rest_framework import viewsets, status, exceptions, views, mixins, generics
 from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.throttling import ScopedRateThrottle
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
 from django.core import exceptions as django_exceptions
+from django.db.models import Prefetch, Sum, Max, Q, DateField
+from django.db.models.functions import Coalesce, TruncMonth
 
+from . import cache, tokens
 from .serializers import *
 from .permissions import *
 from .response import ScanlateResponse
 from .filters import *
+from .mixins import ResponseCacheMixin, cache_response
+from .pagination import CountPagePagination, PaymentPagination
 from .models import *
 
 
@@ -41,6 +47,8 @@ class UserRegisterAPIView(views.APIView):
 class UserLoginAPIView(views.APIView):
     authentication_classes = []
     permission_classes = [AllowAny]
+    throttle_classes = [ScopedRateThrottle]
+    throttle_scope = 'login'
 
     def post(self, request, *args, **kwargs):
         serializer = UserLoginSerializer(data=request.data)
@@ -72,10 +80,42 @@ class UserChangePassword(views.APIView):
             raise serializers.ValidationError(errors)
 
         user.set_password(password)
-        user.save()
+        # request.user may be a cached copy, never write its other fields back
+        user.save(update_fields=['password'])
+        cache.invalidate_users([user.pk])
+        RefreshToken.objects.revoke_user(user)
         return ScanlateResponse(msg='Пароль успешно изменен.')
 
 
+class TokenRefreshAPIView(views.APIView):
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def post(self, request, *args, **kwargs):
+        serializer = TokenRefreshSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        user, refresh_token = RefreshToken.objects.rotate(serializer.validated_data.get('refresh_token'))
+        if user is None or not user.is_active:
+            return ScanlateResponse(msg='Недействительный токен обновления.', status=status.HTTP_401_UNAUTHORIZED)
+        return ScanlateResponse(content=tokens.issue_tokens(user, refresh_token))
+
+
+class TokenRevokeAPIView(views.APIView):
+    def post(self, request, *args, **kwargs):
+        serializer = TokenRevokeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        refresh_token = serializer.validated_data.get('refresh_token')
+        if serializer.validated_data.get('all'):
+            RefreshToken.objects.revoke_user(request.user)
+        elif refresh_token:
+            RefreshToken.objects.revoke(refresh_token, user=request.user)
+        else:
+            raise serializers.ValidationError({'refresh_token': ['Обязательное поле.']})
+        return ScanlateResponse(msg='Токены отозваны.')
+
+
 class UserViewSet(mixins.ListModelMixin,
                   mixins.RetrieveModelMixin,
                   mixins.UpdateModelMixin,
@@ -102,6 +142,11 @@ class UserViewSet(mixins.ListModelMixin,
         else:
             return UserListSerializer
 
+    def get_object(self):
+        if not hasattr(self, '_object'):
+            self._object = super().get_object()
+        return self._object
+
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
         serializer = self.get_serializer(instance)
@@ -116,6 +161,12 @@ class UserViewSet(mixins.ListModelMixin,
         response_serializer = self.get_serializer(user)
         return ScanlateResponse(content=response_serializer.data)
 
+    def perform_destroy(self, instance):
+        user_id = instance.pk
+        super().perform_destroy(instance)
+        cache.invalidate_roles()
+        cache.invalidate_users([user_id])
+
     @action(detail=False, methods=['get'])
     def current(self, request):
         self.check_permissions(request)
@@ -130,11 +181,12 @@ class UserViewSet(mixins.ListModelMixin,
         return ScanlateResponse(content=serializer.data)
 
 
-class TitleViewSet(viewsets.ModelViewSet):
+class TitleViewSet(ResponseCacheMixin, viewsets.ModelViewSet):
     queryset = Title.objects.all()
     permission_classes = [IsAdmin | IsCurator | IsSafeMethod]
     lookup_field = 'slug'
     filter_backends = [TitleFilterBackend]
+    response_cache_models = [Title, WorkerTemplate, User]
 
     def get_serializer_class(self):
         if self.action == 'retrieve':
@@ -148,6 +200,17 @@ class TitleViewSet(viewsets.ModelViewSet):
             return TitleDetailRetrieveSerializer
         return TitleListSerializer
 
+    def get_response_cache_bucket(self):
+        # The catalogue is the same for everyone
+        if self.action == 'list':
+            return 'all'
+        return super().get_response_cache_bucket()
+
+    @cache_response
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cache_response
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
         serializer = self.get_serializer(instance=instance, context={'user': request.user})
@@ -171,10 +234,11 @@ class TitleViewSet(viewsets.ModelViewSet):
         return ScanlateResponse(content=response_serializer.data)
 
 
-class ChapterViewSet(viewsets.ModelViewSet):
+class ChapterViewSet(ResponseCacheMixin, viewsets.ModelViewSet):
     queryset = Chapter.objects.all()
     permission_classes = [IsAdmin | IsCurator]
     filter_backends = [ChapterFilterBackend]
+    response_cache_models = [Chapter, Worker]
 
     def get_serializer_class(self):
         if self.action == 'retrieve':
@@ -185,6 +249,10 @@ class ChapterViewSet(viewsets.ModelViewSet):
             return ChapterRetrieveSerializer
         return ChapterListSerializer
 
+    @cache_response
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
         serializer = self.get_serializer(instance)
@@ -199,6 +267,15 @@ class ChapterViewSet(viewsets.ModelViewSet):
         headers = self.get_success_headers(serializer.data)
         return ScanlateResponse(content=response_serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
+    @action(detail=False, methods=['post'])
+    def bulk(self, request, *args, **kwargs):
+        serializer = ChapterBulkCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        chapters = serializer.save()
+
+        response_serializer = ChapterListSerializer(chapters, many=True)
+        return ScanlateResponse(content=response_serializer.data, status=status.HTTP_201_CREATED)
+
     def update(self, request, *args, **kwargs):
         instance = self.get_object()
         serializer = ChapterUpdateSerializer(instance, data=request.data)
@@ -223,29 +300,67 @@ class WorkerViewSet(viewsets.GenericViewSet):
         return ScanlateResponse(msg='Успешно загружено.')
 
 
-class UserChaptersAPIView(views.APIView):
-    def get(self, request):
-        is_done = query_param_to_bool(request.query_params.get('is_done'))
-        title_id = request.query_params.get('title_id')
-        queryset = Worker.objects.filter(user=request.user, is_done=bool(is_done)).exclude(deadline=None)
+class PaymentViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+    queryset = Payment.objects.all()
+    serializer_class = PaymentSerializer
+    pagination_class = PaymentPagination
+    filter_backends = [PaymentFilterBackend]
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get('group_by') == 'month':
+            return self.list_by_month()
+        return super().list(request, *args, **kwargs)
+
+    def list_by_month(self):
+        queryset = self.filter_queryset(self.get_queryset()).order_by() \
+            .annotate(period=TruncMonth('datetime', output_field=DateField())).values('period') \
+            .annotate(income=Coalesce(Sum('amount', filter=Q(type=PaymentType.IN)), 0),
+                      outcome=Coalesce(Sum('amount', filter=Q(type=PaymentType.OUT)), 0)) \
+            .order_by('-period')
+        serializer = PaymentPeriodSerializer(queryset, many=True)
+        return ScanlateResponse(content=serializer.data)
+
+
+class UserChaptersAPIView(generics.ListAPIView):
+    serializer_class = UserChaptersSerializer
+    pagination_class = CountPagePagination
+
+    def get_queryset(self):
+        is_done = query_param_to_bool(self.request.query_params.get('is_done'))
+        title_id = self.request.query_params.get('title_id')
+        queryset = Worker.objects.filter(user_id=self.request.user.pk, is_done=bool(is_done)).exclude(deadline=None)
 
         if title_id is not None:
             queryset = queryset.filter(chapter__title_id=title_id)
 
-        serializer = UserChaptersSerializer(queryset, many=True)
-        return ScanlateResponse(content=serializer.data)
+        return queryset.select_related('chapter__title').prefetch_related(
+            Prefetch('chapter__workers', queryset=Worker.objects.select_related('user'))
+        ).order_by('role', 'id')
+
+
+class ReleaseCalendarAPIView(generics.ListAPIView):
+    permission_classes = [IsAdmin | IsCurator]
+    serializer_class = ReleaseCalendarSerializer
+    filter_backends = [ReleaseCalendarFilterBackend]
+
+    def get_queryset(self):
+        return Chapter.objects.filter(end_date=None).select_related('title') \
+            .annotate(release_date=Max('workers__eta')).order_by('release_date', 'id')
 
 
 class RolesAPIView(views.APIView):
     permission_classes = [IsAdmin | IsCurator]
 
     def get(self, request):
-        data = []
-        for role in sorted(Role.values):
-            data.append({
-                'role': role,
-                'users': UserNestedSerializer(User.objects.filter(roles__overlap=[role]), many=True).data
-            })
+        data = cache.get_roles()
+        if data is None:
+            users_by_role = {role: [] for role in Role.values}
+            for user_id, username, roles in User.objects.values_list('id', 'username', 'roles'):
+                for role in users_by_role.keys() & set(roles):
+                    users_by_role[role].append({'id': user_id, 'username': username})
+
+            data = [{'role': role, 'users': users_by_role[role]} for role in sorted(Role.values)]
+            cache.set_roles(data)
         return ScanlateResponse(content=data)
 
 